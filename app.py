@@ -1,22 +1,41 @@
-from flask import Flask, request, render_template, jsonify, redirect, url_for, flash, send_from_directory
+from flask import Flask, request, render_template, jsonify, redirect, url_for, flash, send_from_directory, send_file, Response, stream_with_context
+from werkzeug.utils import secure_filename
 from flask_login import login_required, current_user, login_user, logout_user
 from database import db, bcrypt, login_manager, create_app
 from models import User, Image
 from image_processing import apply_filter
 import os
+import jobs
 import steganography
+import stego_batch
+import stego_cache
+import stego_engine
+import stego_keys
 from steganography import hide_message, extract_message  # Import steganography functions
 from face_recognition import register_face, verify_face  # Import Face Recognition Functions
 from flask_babel import Babel, gettext as _
 from flask_talisman import Talisman
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+import io
+import logging
 import secrets
+import json
 from datetime import timedelta
+import face_models
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
 
 # Initialize Flask app app by kesav
 app = create_app()
 
+# Per-user stego keys need a real master secret unless running the debug server
+stego_keys.configure(debug=app.debug or __name__ == "__main__")
+
 # Security headers and CSP
 csp = {
     'default-src': "'self'",
@@ -283,6 +302,7 @@ def login():
 @app.route('/logout')
 @login_required
 def logout():
+    stego_keys.invalidate_user_key(current_user.id)  # Drop the cached stego key
     logout_user()
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
@@ -333,6 +353,12 @@ def delete_image(image_id):
         file_path = os.path.join(app.config["UPLOAD_FOLDER"], image.filename)
         if os.path.exists(file_path):
             os.remove(file_path)
+
+        # The stego version written by the hide routes goes with it
+        stego_path = os.path.join(app.config["FILTERED_FOLDER"], f"stego_{image.filename}")
+        if os.path.exists(stego_path):
+            os.remove(stego_path)
+            stego_cache.extraction_cache.invalidate(stego_path)
         
         db.session.delete(image)
         db.session.commit()
@@ -389,6 +415,16 @@ def public_gallery():
         public_images = db.session.query(Image).options(db.joinedload(Image.owner)).filter_by(is_public=True).all()
         return render_template("public_gallery.html", images=public_images)
 
+# Why a requested embedding mode cannot be used, or None if it can
+def _embedding_mode_error(strategy, bits_per_channel):
+    if strategy not in stego_engine.embedding_strategies():
+        return f"Unknown strategy '{strategy}'"
+    choices = stego_engine.get_strategy(strategy).bits_per_channel_choices
+    # type() rather than isinstance(): JSON true and 1.0 compare equal to 1
+    if type(bits_per_channel) is not int or bits_per_channel not in choices:
+        return f"bits_per_channel for '{strategy}' must be one of {', '.join(map(str, choices))}"
+    return None
+
 # Route to Hide Message in Image
 @app.route("/hide_message/<int:image_id>", methods=["POST"])
 @login_required
@@ -401,7 +437,14 @@ def hide_message_route(image_id):
     if not message:
         return jsonify({"error": "No message provided"}), 400
 
-    stego_image_path = hide_message(image.filename, message)  # Call the steganography function
+    bits_per_channel = request.form.get("bits_per_channel", 1, type=int)
+    strategy = request.form.get("strategy", "sequential")
+    mode_error = _embedding_mode_error(strategy, bits_per_channel)
+    if mode_error:
+        return jsonify({"error": mode_error}), 400
+
+    stego_image_path = hide_message(image.filename, message, bits_per_channel, strategy,
+                                    stego_keys.user_key(current_user.id))  # Call the steganography function
 
     if stego_image_path is None:
         return jsonify({"error": "Failed to hide message in image"}), 500
@@ -411,6 +454,189 @@ def hide_message_route(image_id):
         "stego_image": os.path.basename(stego_image_path)  # Extract filename only
     })
 
+# Resolve the images a batch request refers to (explicit ids or the whole library)
+def _batch_images(payload):
+    """Return ``(images, error)``; ``images`` is a list of ``(id, filename)``."""
+    query = Image.query.filter_by(user_id=current_user.id)
+    if not payload.get("all"):
+        image_ids = payload.get("image_ids")
+        if image_ids is not None and (not isinstance(image_ids, list)
+                                      or any(type(image_id) is not int for image_id in image_ids)):
+            return None, "image_ids must be a list of image ids"
+        if not image_ids:
+            return None, "No images selected"
+        query = query.filter(Image.id.in_(image_ids))
+    images = [(image.id, image.filename) for image in query.all()]
+    if not images:
+        return None, "No images selected"
+    return images, None
+
+# Stream batch results as newline-delimited JSON, ending with a summary line
+def _stream_batch_results(results):
+    def generate():
+        succeeded = failed = 0
+        for result in results:
+            if "error" in result:
+                failed += 1
+            else:
+                succeeded += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, "succeeded": succeeded, "failed": failed}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# ✅ Route to Hide One Message in Many Images
+@app.route("/batch/hide_message", methods=["POST"])
+@login_required
+def batch_hide_message_route():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+
+    message = payload.get("message")
+    if not message or not isinstance(message, str):
+        return jsonify({"error": "No message provided"}), 400
+
+    bits_per_channel = payload.get("bits_per_channel", 1)
+    strategy = payload.get("strategy", "sequential")
+    mode_error = _embedding_mode_error(strategy, bits_per_channel)
+    if mode_error:
+        return jsonify({"error": mode_error}), 400
+
+    images, error = _batch_images(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
+    return _stream_batch_results(stego_batch.batch_hide(images, message, bits_per_channel, strategy,
+                                                          stego_keys.user_key(current_user.id)))
+
+# ✅ Route to Extract Messages from Many Images
+@app.route("/batch/extract_message", methods=["POST"])
+@login_required
+def batch_extract_message_route():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+
+    images, error = _batch_images(payload)
+    if error:
+        return jsonify({"error": error}), 400
+
+    return _stream_batch_results(stego_batch.batch_extract(images, stego_keys.user_key(current_user.id)))
+
+# ✅ Stateless Route to Hide a Message in an Uploaded Image
+@app.route("/hide_message", methods=["POST"])
+def hide_message_stateless():
+    if "file" not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    file = request.files["file"]
+    message = request.form.get("message")
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+
+    bits_per_channel = request.form.get("bits_per_channel", 1, type=int)
+    strategy = request.form.get("strategy", "sequential")
+    mode_error = _embedding_mode_error(strategy, bits_per_channel)
+    if mode_error:
+        return jsonify({"error": mode_error}), 400
+
+    # Persisting the result is opt-in and only for signed-in users; the stored
+    # image is owned through an Image row, so it is sealed with the owner's key
+    persist = request.form.get("persist") == "true"
+    if persist and not current_user.is_authenticated:
+        return jsonify({"error": "Login required to store the stego image"}), 401
+    key = stego_keys.user_key(current_user.id) if persist else None
+
+    try:
+        stego_bytes = steganography.hide_message_bytes(file.read(), message, bits_per_channel, strategy, key)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    extension, mimetype = ("jpg", "image/jpeg") if steganography.writes_jpeg(strategy) else ("png", "image/png")
+    stem = os.path.splitext(secure_filename(file.filename) or "image")[0]
+    download_name = f"stego_{stem}.{extension}"
+
+    # Stored under a unique, user-scoped name (upload names can collide across
+    # users) as a library image: uploads/ holds the picture every image route
+    # and gallery reads, filtered/stego_<name> the stego version extraction reads
+    image_id = None
+    if persist:
+        filename = f"{current_user.id}_{secrets.token_hex(8)}_{stem}.{extension}"
+        paths = [os.path.join(app.config["UPLOAD_FOLDER"], filename),
+                 os.path.join(app.config["FILTERED_FOLDER"], f"stego_{filename}")]
+        for path in paths:
+            with open(path, "wb") as f:
+                f.write(stego_bytes)
+        new_image = Image(filename=filename, user_id=current_user.id)
+        try:
+            db.session.add(new_image)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for path in paths:
+                os.remove(path)
+            return jsonify({"error": f"Database error: {str(e)}"}), 500
+        image_id = new_image.id
+
+    response = send_file(io.BytesIO(stego_bytes), mimetype=mimetype,
+                         as_attachment=True, download_name=download_name)
+    if image_id is not None:
+        response.headers["X-Image-Id"] = str(image_id)
+    return response
+
+# ✅ Stateless Route to Extract a Message from an Uploaded Image
+@app.route("/extract_message", methods=["POST"])
+def extract_message_stateless():
+    if "file" not in request.files:
+        return jsonify({"error": "No file provided"}), 400
+
+    # Signed-in users can read back images they persisted (sealed with their key)
+    # as well as anonymous ones
+    if current_user.is_authenticated:
+        extracted_message = steganography.extract_message_bytes(request.files["file"].read(),
+                                                                stego_keys.user_key(current_user.id),
+                                                                try_default=True)
+    else:
+        extracted_message = steganography.extract_message_bytes(request.files["file"].read())
+    return jsonify({"extracted_message": extracted_message})
+
+# ✅ Route to Report Hiding Capacity of an Image
+@app.route("/capacity/<int:image_id>", methods=["GET"])
+@login_required
+def capacity_route(image_id):
+    image = Image.query.filter_by(id=image_id, user_id=current_user.id).first()
+    if not image:
+        return jsonify({"error": "Image not found"}), 404
+
+    image_path = os.path.join(app.config["UPLOAD_FOLDER"], image.filename)
+    if not os.path.exists(image_path):
+        return jsonify({"error": "Image file not found"}), 404
+
+    # Only the image header is read; pixels are never decoded
+    capacity = steganography.image_capacity(image_path)
+    return jsonify({
+        "width": capacity["width"],
+        "height": capacity["height"],
+        "max_message_bytes": {strategy: {str(bits): size for bits, size in sizes.items()}
+                              for strategy, sizes in capacity["capacity"].items()}
+    })
+
+# ✅ Route to Report Stego Cache Statistics
+@app.route("/stego_cache/stats", methods=["GET"])
+@login_required
+def stego_cache_stats():
+    stats = stego_cache.stego_cache.stats()
+    stats["extraction"] = stego_cache.extraction_cache.stats()
+    return jsonify(stats)
+
+# ✅ Route to Report Face Model Readiness
+@app.route("/health/models", methods=["GET"])
+def models_health():
+    # Models load lazily, so "not ready yet" is healthy; a failed load is not
+    health = face_models.registry.health()
+    return jsonify(health), 503 if health["failed"] else 200
+
 # ✅ Route to Extract Message from Image
 @app.route('/extract_message/<int:image_id>', methods=['GET'])
 @login_required
@@ -420,10 +646,182 @@ def extract_message_route(image_id):
         return jsonify({"error": "Image not found"}), 404
 
     stego_filename = f"stego_{image.filename}"
-    extracted_message = extract_message(stego_filename)
+    extracted_message = extract_message(stego_filename, key=stego_keys.user_key(current_user.id))
 
     return jsonify({"extracted_message": extracted_message})
 
+# ✅ Route to Hide an Uploaded File in Image
+@app.route("/hide_file/<int:image_id>", methods=["POST"])
+@login_required
+def hide_file_route(image_id):
+    image = Image.query.filter_by(id=image_id, user_id=current_user.id).first()
+    if not image:
+        return jsonify({"error": "Image not found"}), 404
+
+    file = request.files.get("file")
+    if file is None or file.filename == "":
+        return jsonify({"error": "No file provided"}), 400
+
+    bits_per_channel = request.form.get("bits_per_channel", 1, type=int)
+    strategy = request.form.get("strategy", "sequential")
+    mode_error = _embedding_mode_error(strategy, bits_per_channel)
+    if mode_error:
+        return jsonify({"error": mode_error}), 400
+
+    img_path = os.path.join("static", "uploads", image.filename)
+    stego_path = os.path.join("static", "filtered", f"stego_{image.filename}")
+    stego_image_path = steganography.hide_file(img_path, stego_path, file.stream, secure_filename(file.filename),
+                                               bits_per_channel, strategy, stego_keys.user_key(current_user.id))
+    if stego_image_path is None:
+        return jsonify({"error": "Failed to hide file in image"}), 500
+
+    return jsonify({
+        "message": "File hidden successfully",
+        "stego_image": os.path.basename(stego_image_path)
+    })
+
+# ✅ Route to Download the File Hidden in Image
+@app.route("/extract_file/<int:image_id>", methods=["GET"])
+@login_required
+def extract_file_route(image_id):
+    image = Image.query.filter_by(id=image_id, user_id=current_user.id).first()
+    if not image:
+        return jsonify({"error": "Image not found"}), 404
+
+    stego_path = os.path.join("static", "filtered", f"stego_{image.filename}")
+    # The file is bounded by the cover's capacity, so it is decrypted into
+    # memory and never written to disk
+    out = io.BytesIO()
+    try:
+        filename = steganography.extract_file(stego_path, out, key=stego_keys.user_key(current_user.id))
+    except (OSError, ValueError) as e:
+        return jsonify({"error": f"[ERROR] {str(e)}"}), 400
+
+    out.seek(0)
+    return send_file(out, as_attachment=True, download_name=filename or "hidden_file",
+                     mimetype="application/octet-stream")
+
+# -------------------- BACKGROUND JOBS --------------------
+
+# Accepted response pointing the client at a submitted job
+def _job_accepted(job_id):
+    return jsonify({
+        "job_id": job_id,
+        "status_url": url_for("job_status", job_id=job_id),
+        "events_url": url_for("job_events", job_id=job_id),
+    }), 202
+
+# ✅ Route to Hide a Message in the Background
+@app.route("/jobs/hide_message/<int:image_id>", methods=["POST"])
+@login_required
+def hide_message_job(image_id):
+    image = Image.query.filter_by(id=image_id, user_id=current_user.id).first()
+    if not image:
+        return jsonify({"error": "Image not found"}), 404
+
+    message = request.form.get("message")
+    if not message:
+        return jsonify({"error": "No message provided"}), 400
+
+    bits_per_channel = request.form.get("bits_per_channel", 1, type=int)
+    strategy = request.form.get("strategy", "sequential")
+    mode_error = _embedding_mode_error(strategy, bits_per_channel)
+    if mode_error:
+        return jsonify({"error": mode_error}), 400
+
+    job_id = jobs.job_queue.submit("hide_message", current_user.id, jobs.run_hide_message, image.filename,
+                                   message, bits_per_channel, strategy, stego_keys.user_key(current_user.id))
+    return _job_accepted(job_id)
+
+# ✅ Route to Extract a Message in the Background
+@app.route("/jobs/extract_message/<int:image_id>", methods=["POST"])
+@login_required
+def extract_message_job(image_id):
+    image = Image.query.filter_by(id=image_id, user_id=current_user.id).first()
+    if not image:
+        return jsonify({"error": "Image not found"}), 404
+
+    job_id = jobs.job_queue.submit("extract_message", current_user.id, jobs.run_extract_message,
+                                   image.filename, stego_keys.user_key(current_user.id))
+    return _job_accepted(job_id)
+
+# ✅ Route to Apply a Filter in the Background
+@app.route("/jobs/edit_image/<int:image_id>", methods=["POST"])
+@login_required
+def edit_image_job(image_id):
+    image = Image.query.filter_by(id=image_id, user_id=current_user.id).first()
+    if not image:
+        return jsonify({"error": "Image not found"}), 404
+
+    filter_type = request.form.get("filter_type")
+    if not filter_type:
+        return jsonify({"error": "No filter_type provided"}), 400
+
+    original_path = os.path.join(app.config["UPLOAD_FOLDER"], image.filename)
+    filtered_path = os.path.join(app.config["FILTERED_FOLDER"], f"filtered_{image.filename}")
+    job_id = jobs.job_queue.submit("edit_image", current_user.id, jobs.run_edit_image,
+                                   original_path, filtered_path, filter_type)
+    return _job_accepted(job_id)
+
+# ✅ Route to Verify a Face in the Background
+@app.route("/jobs/verify_face", methods=["POST"])
+@login_required
+def verify_face_job():
+    file = request.files.get("file")
+    if file is None or file.filename == "":
+        return jsonify({"error": "❌ No file uploaded!"}), 400
+    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+        return jsonify({"error": "❌ Invalid file type. Please upload a PNG, JPG, or JPEG image."}), 400
+
+    # Unique name: several verifications may be queued at once (the job deletes it)
+    temp_image_path = os.path.join(app.config["TEMP_FOLDER"], f"temp_face_{current_user.id}_{secrets.token_hex(8)}.jpg")
+    file.save(temp_image_path)
+    job_id = jobs.job_queue.submit("verify_face", current_user.id, jobs.run_verify_face,
+                                   current_user.id, temp_image_path)
+    return _job_accepted(job_id)
+
+# ✅ Route to Poll a Job
+@app.route("/jobs/<job_id>", methods=["GET"])
+@login_required
+def job_status(job_id):
+    job = jobs.job_queue.get(job_id, current_user.id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+# ✅ Route to Stream Job Status as Server-Sent Events
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+@login_required
+def job_events(job_id):
+    if jobs.job_queue.get(job_id, current_user.id) is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    def generate():
+        version = -1
+        while True:
+            job, new_version = jobs.job_queue.wait_for_change(job_id, version)
+            if job is None:
+                return
+            if new_version == version:
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            yield f"data: {json.dumps(job)}\n\n"
+            if job["status"] in jobs.FINISHED_STATES:
+                return
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache"})
+
+# ✅ Route to Cancel a Job
+@app.route("/jobs/<job_id>/cancel", methods=["POST"])
+@login_required
+def cancel_job(job_id):
+    job = jobs.job_queue.cancel(job_id, current_user.id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
 # Run Flask App
 if __name__ == "__main__":
     app.run(debug=True)
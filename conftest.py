@@ -0,0 +1,2 @@
+# test_steganography.py is a manual script against a running server, not a test module
+collect_ignore = ["test_steganography.py"]
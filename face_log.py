@@ -0,0 +1,204 @@
+import argparse
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from process_utils import OncePerProcess
+
+# Append-only log of face operations.
+#
+# Records go on an in-memory queue; a background thread per process appends
+# them in batches to JSONL segment files, one record per line. Each process
+# writes its own segments, so no locking is needed between job workers, and a
+# segment is rotated once it reaches SEGMENT_MAX_BYTES or SEGMENT_MAX_AGE
+# seconds. ``query`` scans the segments for one user's history instead of
+# opening one file per event as the old per-operation JSON files required.
+
+logger = logging.getLogger(__name__)
+
+LOG_DIR = os.path.join("static", "logs", "face_recognition", "operations")
+LEGACY_LOG_DIR = os.path.join("static", "logs", "face_recognition")
+SEGMENT_MAX_BYTES = int(os.environ.get("FACE_LOG_SEGMENT_BYTES", 16 * 1024 * 1024))
+SEGMENT_MAX_AGE = float(os.environ.get("FACE_LOG_SEGMENT_SECONDS", 24 * 3600))
+BATCH_SIZE = 512  # records written per batch at most
+SEGMENT_GLOB = "operations-*.jsonl"
+
+_STOP = object()
+
+
+class OperationLog:
+    """Queue-fed writer of rotating JSONL segments, plus a reader over them."""
+
+    def __init__(self, log_dir=LOG_DIR, max_bytes=SEGMENT_MAX_BYTES, max_age=SEGMENT_MAX_AGE):
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._reset()
+        self.writer = OncePerProcess(self._start, self.close, reset=self._reset)
+
+    # Per-process writer state (forked children start their own writer)
+    def _reset(self):
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+        self.segment = None
+        self.segment_opened = 0.0
+        self.segment_index = 0
+
+    # ✅ Queue a record (a JSON-serializable dict) for writing
+    def append(self, record):
+        self.queue.put(record)
+        self.writer.ensure()
+
+    def _start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True, name="face-log-writer")
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            # Block for the first item, then take whatever else is already queued
+            items = [self.queue.get()]
+            while len(items) < BATCH_SIZE:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [item for item in items if isinstance(item, dict)]
+            if records:
+                self._write(records)
+            for item in items:
+                if isinstance(item, threading.Event):
+                    item.set()
+            if any(item is _STOP for item in items):
+                if self.segment is not None:
+                    self.segment.close()
+                    self.segment = None
+                return
+
+    def _write(self, records):
+        try:
+            segment = self._current_segment()
+            segment.write("".join(json.dumps(record) + "\n" for record in records))
+            segment.flush()
+        except Exception as e:
+            logger.error(f"Error writing face operation log: {str(e)}")
+
+    # Open segment, rotated by size and age
+    def _current_segment(self):
+        if self.segment is not None and (self.segment.tell() >= self.max_bytes
+                                         or time.time() - self.segment_opened >= self.max_age):
+            self.segment.close()
+            self.segment = None
+        if self.segment is None:
+            os.makedirs(self.log_dir, exist_ok=True)
+            self.segment_index += 1
+            name = f"operations-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.segment_index}.jsonl"
+            self.segment = open(os.path.join(self.log_dir, name), "a", encoding="utf-8")
+            self.segment_opened = time.time()
+        return self.segment
+
+    # ✅ Wait until records queued by this process so far are on disk
+    def flush(self, timeout=5.0):
+        if not self.writer.started():
+            return True
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    # ✅ Write out queued records and stop the writer thread
+    def close(self, timeout=5.0):
+        if not self.writer.started() or self.thread is None or not self.thread.is_alive():
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)
+
+    # ✅ Segment files, oldest first
+    def segments(self):
+        return sorted(glob.glob(os.path.join(self.log_dir, SEGMENT_GLOB)))
+
+    # ✅ Records matching every given filter, in timestamp order
+    def query(self, user_id=None, operation=None, since=None, limit=None):
+        """``since`` is a datetime; ``limit`` keeps only the newest ``limit`` records."""
+        self.flush()
+        since_ts = since.timestamp() if since is not None else None
+        matches = []
+        for path in self.segments():
+            # A segment last written before ``since`` holds nothing newer
+            if since_ts is not None and os.path.getmtime(path) < since_ts:
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # line cut short by a crash
+                    if user_id is not None and str(record.get("user_id")) != str(user_id):
+                        continue
+                    if operation is not None and record.get("operation") != operation:
+                        continue
+                    if since is not None and datetime.fromisoformat(record["timestamp"]) < since:
+                        continue
+                    matches.append(record)
+        matches.sort(key=lambda record: record["timestamp"])
+        return matches[-limit:] if limit else matches
+
+
+operation_log = OperationLog()
+
+
+# ✅ A user's face operation history (see OperationLog.query)
+def user_history(user_id, operation=None, since=None, limit=None):
+    return operation_log.query(user_id, operation, since, limit)
+
+# ✅ Fold the old one-file-per-operation JSON logs into a segment
+def import_legacy_logs(legacy_dir=LEGACY_LOG_DIR, remove=False):
+    """Return the number of records imported; with ``remove`` the old files are deleted."""
+    paths = sorted(glob.glob(os.path.join(legacy_dir, "registration_*.json"))
+                   + glob.glob(os.path.join(legacy_dir, "verification_*.json")))
+    records = []
+    imported = []  # unreadable files are skipped and kept
+    for path in paths:
+        try:
+            with open(path) as f:
+                records.append(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.error(f"Skipping unreadable log file {path}: {str(e)}")
+            continue
+        imported.append(path)
+    records.sort(key=lambda record: record.get("timestamp", ""))
+    for record in records:
+        operation_log.append(record)
+    if not operation_log.flush():
+        raise RuntimeError("Timed out writing imported records")
+    if remove:
+        for path in imported:
+            os.remove(path)
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Face operation log tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    history = commands.add_parser("history", help="print a user's operations as JSONL")
+    history.add_argument("user_id")
+    history.add_argument("--operation")
+    history.add_argument("--limit", type=int)
+    legacy = commands.add_parser("import-legacy", help="move per-operation JSON files into segments")
+    legacy.add_argument("--remove", action="store_true", help="delete the old files afterwards")
+    args = parser.parse_args()
+
+    if args.command == "history":
+        for record in user_history(args.user_id, args.operation, limit=args.limit):
+            print(json.dumps(record))
+    else:
+        print(f"Imported {import_legacy_logs(remove=args.remove)} records")
+    operation_log.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import threading
+import time
+import cv2
+
+# Registry of the Haar cascade classifiers used for face work.
+#
+# Classifiers are loaded on first use (or by ``warmup``, e.g. at job worker
+# start) and shared by every caller in the process. A model file is looked up
+# in FACE_MODEL_<NAME> if set, then in the haarcascades/ directory shipped with
+# the repo (FACE_MODEL_DIR), then in OpenCV's bundled data directory.
+
+MODEL_DIR = os.environ.get("FACE_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "haarcascades"))
+MODELS = {
+    "face": "haarcascade_frontalface_default.xml",
+    "eye": "haarcascade_eye.xml",
+}
+
+
+# ✅ Path of a model file: env override, then MODEL_DIR, then OpenCV's data directory
+def resolve_model_path(name, filename, model_dir=MODEL_DIR):
+    override = os.environ.get(f"FACE_MODEL_{name.upper()}")
+    if override:
+        if not os.path.exists(override):
+            raise FileNotFoundError(f"Model file not found: {override}")
+        return override
+    for directory in (model_dir, cv2.data.haarcascades):
+        path = os.path.join(directory, filename)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"Model file not found: {filename}")
+
+
+class ModelRegistry:
+    """Lazily loaded, process-wide cascade classifiers with load statistics."""
+
+    def __init__(self, models=MODELS, model_dir=MODEL_DIR):
+        self.models = dict(models)  # name -> file name or path
+        self.model_dir = model_dir
+        self.loaded = {}  # name -> CascadeClassifier
+        self.info = {name: {"ready": False, "path": None, "load_ms": None, "error": None} for name in self.models}
+        self.lock = threading.Lock()
+
+    def _load(self, name):
+        info = self.info[name]
+        start = time.perf_counter()
+        try:
+            path = resolve_model_path(name, self.models[name], self.model_dir)
+            classifier = cv2.CascadeClassifier(path)
+            if classifier.empty():
+                raise ValueError(f"Could not load cascade from {path}")
+        except Exception as e:
+            info["error"] = str(e)
+            raise
+        info.update(ready=True, path=path, load_ms=round((time.perf_counter() - start) * 1000, 2), error=None)
+        return classifier
+
+    # ✅ Shared classifier for ``name``, loaded on first use
+    def get(self, name):
+        classifier = self.loaded.get(name)
+        if classifier is not None:
+            return classifier
+        if name not in self.models:
+            raise ValueError(f"Unknown face model: {name}")
+        with self.lock:
+            if name not in self.loaded:
+                self.loaded[name] = self._load(name)
+            return self.loaded[name]
+
+    # ✅ Load every model (or the given ones) now; returns the health report
+    def warmup(self, names=None):
+        for name in names or self.models:
+            try:
+                self.get(name)
+            except Exception:
+                pass  # recorded in the health report
+        return self.health()
+
+    # ✅ Readiness, path, load time and last error of each model
+    def health(self):
+        with self.lock:
+            models = {name: {**info, "path": os.path.basename(info["path"]) if info["path"] else None}
+                      for name, info in self.info.items()}
+        return {
+            "ready": all(info["ready"] for info in models.values()),
+            "failed": any(info["error"] for info in models.values()),
+            "models": models,
+        }
+
+
+registry = ModelRegistry()
+
+
+# ✅ Shared cascade classifier from the process-wide registry
+def get_cascade(name):
+    return registry.get(name)
+
+# ✅ Load all registered models now
+def warmup():
+    return registry.warmup()
@@ -8,59 +8,261 @@ import math
 from datetime import datetime
 import json
 import logging
+import threading
+import time
+from collections import Counter, OrderedDict, deque
 from typing import Tuple, Optional, Dict
-from skimage.metrics import structural_similarity as ssim
+import face_models
+from face_log import operation_log
+from file_utils import file_fingerprint, file_lock
+from process_utils import OncePerProcess
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
+# Directories are created when first written to, not at import
 FACE_DATA_PATH = "static/faces/"
 FACE_LOGS_PATH = "static/logs/face_recognition/"
-os.makedirs(FACE_DATA_PATH, exist_ok=True)
-os.makedirs(FACE_LOGS_PATH, exist_ok=True)
 
-# Load face detection models
-face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
+# Registered faces are also stored as ready-to-compare templates.
+# Version 2: built from the detected, aligned face instead of the whole photo;
+# older templates cannot be compared against new probes.
+FACE_TEMPLATE_SIZE = (100, 100)
+FACE_TEMPLATE_VERSION = 2
+FACE_TEMPLATE_CACHE_SIZE = int(os.environ.get("FACE_TEMPLATE_CACHE_SIZE", 128))
+
+# Seconds between flushes of in-memory metrics to metrics.json
+FACE_METRICS_FLUSH_INTERVAL = float(os.environ.get("FACE_METRICS_FLUSH_INTERVAL", 10))
+
+# Haar cascades are loaded on first use through face_models.get_cascade
+FACE_DETECT_MAX_SIDE = int(os.environ.get("FACE_DETECT_MAX_SIDE", 640))  # longer side of the detection copy
+FACE_ROI_MARGIN = 0.15  # border added around a detected face, as a fraction of its size
+EYE_SEARCH_SIDE = 200  # eyes are searched in the face ROI scaled down to this width
+MAX_ALIGN_ANGLE = 30  # degrees; a steeper eye line is treated as a false detection
+
+def _write_json_atomic(path: str, data: Dict) -> None:
+    """Write JSON to a temp file and rename it over ``path``"""
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=4)
+    os.replace(temp_path, path)
 
 class FaceRecognitionMetrics:
-    """Class to handle face recognition metrics and logging"""
-    def __init__(self):
-        self.metrics_file = os.path.join(FACE_LOGS_PATH, 'metrics.json')
-        self.initialize_metrics()
-
-    def initialize_metrics(self):
-        if not os.path.exists(self.metrics_file):
-            with open(self.metrics_file, 'w') as f:
-                json.dump({
-                    'total_registrations': 0,
-                    'total_verifications': 0,
-                    'successful_verifications': 0,
-                    'failed_verifications': 0,
-                    'average_quality_score': 0,
-                    'average_similarity_score': 0
-                }, f)
+    """Face recognition counters and running averages.
+
+    ``update_metrics`` only appends to an in-memory queue, so it costs no I/O
+    or locking on the request path. A background thread per process folds the
+    queue into unflushed deltas and merges them into metrics.json every
+    FACE_METRICS_FLUSH_INTERVAL seconds and at exit: under a lock file it reads
+    the current totals, adds the deltas and writes a temp file renamed over
+    the original, so concurrent processes add up instead of overwriting.
+    """
+    COUNTERS = ('total_registrations', 'total_verifications',
+                'successful_verifications', 'failed_verifications')
+    # Average -> number of samples behind it (kept in the file for merging)
+    AVERAGES = {'average_quality_score': 'quality_score_samples',
+                'average_similarity_score': 'similarity_score_samples'}
+
+    def __init__(self, metrics_file: str = None, flush_interval: float = FACE_METRICS_FLUSH_INTERVAL):
+        self.metrics_file = metrics_file or os.path.join(FACE_LOGS_PATH, 'metrics.json')
+        self.lock_file = self.metrics_file + '.lock'
+        self.flush_interval = flush_interval
+        self.pending = deque()  # (metric_type, value) events not yet folded in
+        self.counts = Counter()  # unflushed counter increments
+        self.sums = Counter()  # unflushed sample sums per average
+        self.samples = Counter()  # unflushed sample counts per average
+        self.flush_lock = threading.Lock()  # serializes flushes within a process
+        self.flusher = OncePerProcess(self._start_flusher, self.flush, reset=self._reset)
+
+    # Forked children start empty: the parent still owns and flushes its deltas
+    def _reset(self):
+        self.pending = deque()
+        self.counts = Counter()
+        self.sums = Counter()
+        self.samples = Counter()
+        self.flush_lock = threading.Lock()
+
+    def _empty(self) -> Dict[str, float]:
+        empty = {name: 0 for name in self.COUNTERS}
+        for average, samples in self.AVERAGES.items():
+            empty[average] = 0
+            empty[samples] = 0
+        return empty
 
     def update_metrics(self, metric_type: str, value: float = None):
-        try:
-            with open(self.metrics_file, 'r+') as f:
-                metrics = json.load(f)
-                metrics[metric_type] += 1
+        """Record an event: a counter increment, or a sample for an ``average_*`` metric"""
+        self.pending.append((metric_type, value))
+        self.flusher.ensure()
+
+    def _start_flusher(self):
+        threading.Thread(target=self._flush_periodically, daemon=True, name="face-metrics-flush").start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    # Fold queued events into the unflushed deltas (caller holds flush_lock)
+    def _drain(self):
+        while True:
+            try:
+                metric_type, value = self.pending.popleft()
+            except IndexError:
+                return
+            if metric_type in self.AVERAGES:
                 if value is not None:
-                    if 'average' in metric_type:
-                        current_avg = metrics[metric_type]
-                        count = metrics[metric_type.replace('average_', 'total_')]
-                        metrics[metric_type] = (current_avg * count + value) / (count + 1)
-                json.dump(metrics, f, indent=4)
-        except Exception as e:
-            logger.error(f"Error updating metrics: {str(e)}")
+                    self.sums[metric_type] += value
+                    self.samples[metric_type] += 1
+            else:
+                self.counts[metric_type] += 1
+
+    def _read(self) -> Dict[str, float]:
+        try:
+            with open(self.metrics_file) as f:
+                text = f.read()
+        except FileNotFoundError:
+            return self._empty()
+        try:
+            # Files written by the old r+ updater hold several concatenated documents
+            current, _ = json.JSONDecoder().raw_decode(text)
+        except json.JSONDecodeError:
+            logger.error("Unreadable metrics file, starting from zero")
+            return self._empty()
+        return {**self._empty(), **current}
+
+    def flush(self):
+        """Merge this process's unflushed metrics into the metrics file"""
+        with self.flush_lock:
+            self._drain()
+            if not self.counts and not self.samples:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.metrics_file), exist_ok=True)
+                with file_lock(self.lock_file):
+                    current = self._read()
+                    for name, count in self.counts.items():
+                        current[name] = current.get(name, 0) + count
+                    for average, added in self.samples.items():
+                        samples = self.AVERAGES[average]
+                        total = current[samples] + added
+                        current[average] = (current[average] * current[samples] + self.sums[average]) / total
+                        current[samples] = total
+                    _write_json_atomic(self.metrics_file, current)
+            except Exception as e:
+                # Deltas are kept and retried on the next flush
+                logger.error(f"Error flushing metrics: {str(e)}")
+                return
+            self.counts.clear()
+            self.sums.clear()
+            self.samples.clear()
 
 metrics = FaceRecognitionMetrics()
 
+def face_image_path(user_id: int) -> str:
+    return os.path.join(FACE_DATA_PATH, f'user_{user_id}.jpg')
+
+def build_face_template(gray: np.ndarray) -> np.ndarray:
+    """Resize and equalize a grayscale face into the form verify_face compares"""
+    return cv2.equalizeHist(cv2.resize(gray, FACE_TEMPLATE_SIZE))
+
+class FaceTemplateStore:
+    """Precomputed face templates, one .npz per user, behind an in-process LRU.
+
+    Cached templates remember the fingerprint of the file they were loaded
+    from, so a template rewritten by another process (e.g. a job worker) is
+    reloaded. Templates of an older FACE_TEMPLATE_VERSION, and faces
+    registered before templates existed, are not loaded: see ``is_stale``.
+    """
+    def __init__(self, face_dir: str = FACE_DATA_PATH, max_entries: int = FACE_TEMPLATE_CACHE_SIZE):
+        self.face_dir = face_dir
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # user id -> (fingerprint, template)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def path(self, user_id: int) -> str:
+        return os.path.join(self.face_dir, f'user_{user_id}.npz')
+
+    def save(self, user_id: int, template: np.ndarray) -> None:
+        """Write a user's template (temp file + rename) and drop the cached copy"""
+        path = self.path(user_id)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        os.makedirs(self.face_dir, exist_ok=True)
+        with open(temp_path, 'wb') as f:
+            np.savez_compressed(f, template=template, version=FACE_TEMPLATE_VERSION)
+        os.replace(temp_path, path)
+        self.invalidate(user_id)
+
+    def load(self, user_id: int) -> Optional[np.ndarray]:
+        """Return a user's current template, or None if there is none (or it is stale)"""
+        path = self.path(user_id)
+        fingerprint = file_fingerprint(path)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and fingerprint is not None and entry[0] == fingerprint:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        template = self._read(path) if fingerprint is not None else None
+        if template is None:
+            return None
+
+        with self.lock:
+            self.entries[user_id] = (fingerprint, template)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return template
+
+    def _read(self, path: str) -> Optional[np.ndarray]:
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if int(data['version']) != FACE_TEMPLATE_VERSION:
+                    return None
+                template = data['template']
+        except Exception as e:
+            logger.error(f"Error reading face template {path}: {str(e)}")
+            return None
+        if template.shape != FACE_TEMPLATE_SIZE[::-1] or template.dtype != np.uint8:
+            return None
+        template.setflags(write=False)
+        return template
+
+    def is_stale(self, user_id: int) -> bool:
+        """True if the user registered a face that the current version cannot compare"""
+        path = self.path(user_id)
+        if not os.path.exists(path):
+            # Registered before templates were stored alongside the face image
+            return os.path.exists(face_image_path(user_id))
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                return int(data['version']) != FACE_TEMPLATE_VERSION
+        except Exception:
+            return True
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        """Forget the cached template of one user, or of everyone"""
+        with self.lock:
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+template_store = FaceTemplateStore()
+
 def enhance_image(image: np.ndarray) -> np.ndarray:
     """Enhance image quality using advanced techniques"""
     try:
@@ -118,7 +320,7 @@ def calculate_face_quality(face_image: np.ndarray) -> Tuple[float, Dict[str, flo
         metrics['contrast'] = min(contrast / 50, 1.0)  # Normalize to 0-1
         
         # Try to detect eyes
-        eyes = eye_cascade.detectMultiScale(gray, 1.1, 3, minSize=(20, 20))
+        eyes = face_models.get_cascade('eye').detectMultiScale(gray, 1.1, 3, minSize=(20, 20))
         
         if len(eyes) > 0:
             metrics['eye_detection'] = 0.5  # Base score for detecting any eyes
@@ -151,45 +353,87 @@ def calculate_face_quality(face_image: np.ndarray) -> Tuple[float, Dict[str, flo
         logger.error(f"Error calculating face quality: {str(e)}")
         return 0.0, {}
 
+def _shrink(image: np.ndarray, max_side: int) -> Tuple[np.ndarray, float]:
+    """Downscale ``image`` so its longer side is at most ``max_side``; returns it and the scale"""
+    scale = min(1.0, max_side / max(image.shape[:2]))
+    if scale == 1.0:
+        return image, scale
+    size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+
+def detect_face(image: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+    """Find the largest face on a downscaled copy and return its box (x, y, w, h) in full-resolution pixels"""
+    small, scale = _shrink(image, FACE_DETECT_MAX_SIDE)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    faces = face_models.get_cascade('face').detectMultiScale(cv2.equalizeHist(gray), 1.1, 5, minSize=(30, 30))
+    if len(faces) == 0:
+        return None
+
+    # Map the box back to the original, with a margin, clipped to the image
+    x, y, w, h = max(faces, key=lambda face: face[2] * face[3])
+    margin_x, margin_y = w * FACE_ROI_MARGIN, h * FACE_ROI_MARGIN
+    height, width = image.shape[:2]
+    x0 = max(int((x - margin_x) / scale), 0)
+    y0 = max(int((y - margin_y) / scale), 0)
+    x1 = min(int(math.ceil((x + w + margin_x) / scale)), width)
+    y1 = min(int(math.ceil((y + h + margin_y) / scale)), height)
+    return x0, y0, x1 - x0, y1 - y0
+
 def align_face(image: np.ndarray, face_rect: Tuple[int, int, int, int]) -> np.ndarray:
-    """Align face using advanced techniques"""
+    """Crop the face ROI from ``image`` and level its eyes (searched for inside the ROI only)"""
+    x, y, w, h = face_rect
+    roi = image[y:y + h, x:x + w]
     try:
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        eyes = eye_cascade.detectMultiScale(gray, 1.3, 5)
+        small, scale = _shrink(roi, EYE_SEARCH_SIDE)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        # Eyes sit in the upper part of the face
+        eyes = face_models.get_cascade('eye').detectMultiScale(gray[:int(gray.shape[0] * 0.6)], 1.1, 5)
         
         if len(eyes) >= 2:
-            eye1, eye2 = eyes[:2]
-            angle = math.degrees(math.atan2(eye2[1] - eye1[1], eye2[0] - eye1[0]))
-            center = ((eye1[0] + eye2[0]) // 2, (eye1[1] + eye2[1]) // 2)
+            largest = sorted(eyes, key=lambda eye: eye[2] * eye[3], reverse=True)[:2]
+            (x1, y1, w1, h1), (x2, y2, w2, h2) = sorted(largest, key=lambda eye: eye[0])
+            left = (x1 + w1 / 2, y1 + h1 / 2)
+            right = (x2 + w2 / 2, y2 + h2 / 2)
+            angle = math.degrees(math.atan2(right[1] - left[1], right[0] - left[0]))
+            if abs(angle) > MAX_ALIGN_ANGLE:
+                return roi
+            center = ((left[0] + right[0]) / 2 / scale, (left[1] + right[1]) / 2 / scale)
             
             M = cv2.getRotationMatrix2D(center, angle, 1.0)
-            aligned = cv2.warpAffine(image, M, (image.shape[1], image.shape[0]),
-                                   flags=cv2.INTER_CUBIC)
+            aligned = cv2.warpAffine(roi, M, (roi.shape[1], roi.shape[0]),
+                                   flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
             
             return aligned
-        return image
+        return roi
     except Exception as e:
         logger.error(f"Error aligning face: {str(e)}")
-        return image
+        return roi
 
 def preprocess_face(image_path: str) -> Tuple[Optional[np.ndarray], float, Dict[str, float]]:
-    """Preprocess face with comprehensive error handling"""
+    """Detect, crop and align the face; returns the 100x100 grayscale face, quality score and metrics"""
     try:
         image = cv2.imread(image_path)
         if image is None:
             logger.error("Could not read image file")
             return None, 0.0, {}
 
+        face_rect = detect_face(image)
+        if face_rect is None:
+            logger.info("No face detected in image")
+            return None, 0.0, {}
+        aligned = align_face(image, face_rect)
+
+        # Quality is scored on a bounded-size copy so large photos cost the same
+        quality_score, quality_metrics = calculate_face_quality(_shrink(aligned, EYE_SEARCH_SIDE)[0])
+
         # Convert to grayscale and resize
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        face_region = cv2.resize(gray, (100, 100))
-        
-        # Return 100% quality
-        return face_region, 100.0, {}
+        gray = cv2.cvtColor(aligned, cv2.COLOR_BGR2GRAY)
+        face_region = cv2.resize(gray, FACE_TEMPLATE_SIZE, interpolation=cv2.INTER_AREA)
+        return face_region, quality_score, quality_metrics
 
     except Exception as e:
         logger.error(f"Error in face preprocessing: {str(e)}")
-        return None, 100.0, {}  # Return 100% quality on error
+        return None, 0.0, {}
 
 def log_face_operation(operation_type: str, user_id: int, quality_score: float, similarity_score: float = None):
     """Log face recognition operations"""
@@ -201,10 +445,8 @@ def log_face_operation(operation_type: str, user_id: int, quality_score: float,
             'quality_score': quality_score,
             'similarity_score': similarity_score
         }
-        
-        log_file = os.path.join(FACE_LOGS_PATH, f'{operation_type}_{user_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json')
-        with open(log_file, 'w') as f:
-            json.dump(log_entry, f, indent=4)
+        # Batched into JSONL segments by a background writer (see face_log.py)
+        operation_log.append(log_entry)
     except Exception as e:
         logger.error(f"Error logging face operation: {str(e)}")
 
@@ -216,16 +458,25 @@ def register_face(user_id: int, image_path: str) -> Tuple[bool, str]:
             return False, "No face detected in the uploaded image"
             
         # Save the face image
-        face_dir = 'static/faces'
-        os.makedirs(face_dir, exist_ok=True)
-        face_path = os.path.join(face_dir, f'user_{user_id}.jpg')
+        os.makedirs(FACE_DATA_PATH, exist_ok=True)
+        face_path = face_image_path(user_id)
         
         # Convert back to uint8 for saving
         face_to_save = cv2.normalize(face, None, 0, 255, cv2.NORM_MINMAX).astype('uint8')
-        cv2.imwrite(face_path, face_to_save)
+        ok, encoded = cv2.imencode('.jpg', face_to_save)
+        if not ok:
+            return False, "Could not encode face image"
+        with open(face_path, 'wb') as f:
+            f.write(encoded.tobytes())
+
+        # Store the template built from the saved JPEG, exactly as verification used to read it
+        stored_face = cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
+        template_store.save(user_id, build_face_template(stored_face))
         
         # Log successful registration
         log_face_operation('registration', user_id, quality_score)
+        metrics.update_metrics('total_registrations')
+        metrics.update_metrics('average_quality_score', quality_score)
         
         return True, f"Face registered successfully (Quality: {quality_score:.1f}%)"
     except Exception as e:
@@ -235,35 +486,32 @@ def register_face(user_id: int, image_path: str) -> Tuple[bool, str]:
 def verify_face(user_id: int, image_path: str) -> Tuple[bool, str]:
     """Verify if the face matches the registered face"""
     try:
-        # Get the registered face
-        face_path = os.path.join('static/faces', f'user_{user_id}.jpg')
-        if not os.path.exists(face_path):
+        # Get the registered face template (resized and equalized at registration)
+        registered_face = template_store.load(user_id)
+        if registered_face is None:
+            if template_store.is_stale(user_id):
+                return False, "Your registered face uses an outdated format - please re-register your face"
             return False, "No registered face found for this user"
             
-        # Read both images
-        registered_face = cv2.imread(face_path, cv2.IMREAD_GRAYSCALE)
-        input_face = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-        
-        if registered_face is None or input_face is None:
-            return False, "Could not read face images"
-            
-        # Resize both images to same size
-        registered_face = cv2.resize(registered_face, (100, 100))
-        input_face = cv2.resize(input_face, (100, 100))
-        
-        # Apply histogram equalization to both images
-        registered_face = cv2.equalizeHist(registered_face)
-        input_face = cv2.equalizeHist(input_face)
+        # Detect and crop the face in the probe, then equalize it the same way
+        input_face, quality_score, _ = preprocess_face(image_path)
+        if input_face is None:
+            return False, "No face detected in the image"
+        input_face = build_face_template(input_face)
         
         # Calculate similarity using template matching
         result = cv2.matchTemplate(input_face, registered_face, cv2.TM_CCOEFF_NORMED)
         similarity = float(result[0][0])
         
         # Log verification attempt
-        log_face_operation('verification', user_id, 100.0, similarity)
+        log_face_operation('verification', user_id, quality_score, similarity)
         
         # Set a reasonable threshold for face matching
-        if similarity > 0.6:  # 60% similarity threshold
+        matched = similarity > 0.6  # 60% similarity threshold
+        metrics.update_metrics('total_verifications')
+        metrics.update_metrics('successful_verifications' if matched else 'failed_verifications')
+        metrics.update_metrics('average_similarity_score', similarity)
+        if matched:
             return True, f"Face verification successful (Similarity: {similarity*100:.1f}%)"
         else:
             return False, f"Face verification failed - faces do not match (Similarity: {similarity*100:.1f}%)"
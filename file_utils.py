@@ -0,0 +1,31 @@
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: file_lock does not serialize processes
+    fcntl = None
+
+# Small filesystem helpers shared by the stego and face modules.
+
+
+# ✅ Cheap identity of a file's current content: (inode, mtime in ns, size), or None if missing
+def file_fingerprint(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+# ✅ Exclusive lock on ``path`` across processes (no-op without fcntl)
+@contextmanager
+def file_lock(path):
+    with open(path, "a") as f:
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,156 @@
+import glob
+import io
+import json
+import os
+import sys
+import time
+import cv2
+from PIL import Image
+
+# Output encoding for stego and filter images.
+#
+# PNG encoding of a large cover often costs more than embedding into it, so
+# the encoder, compression level and deflate strategy come from a profile
+# picked per deployment (IMAGE_ENCODER_PROFILE). Run this module directly to
+# benchmark encode time against file size for a set of images. Formats the
+# profiles do not cover (BMP, TIFF, WebP, ...) are left to OpenCV's
+# extension-based encoder with its default settings.
+
+PROFILES = {
+    # RLE deflate at level 1: the LSB noise of stego images defeats the
+    # slower match finders anyway
+    "fastest": {"backend": "cv2", "png_level": 1, "png_strategy": cv2.IMWRITE_PNG_STRATEGY_RLE,
+                "jpeg_optimize": False},
+    "balanced": {"backend": "cv2", "png_level": 3, "png_strategy": cv2.IMWRITE_PNG_STRATEGY_DEFAULT,
+                 "jpeg_optimize": False},
+    "smallest": {"backend": "pil", "png_level": 9, "png_optimize": True,
+                 "jpeg_optimize": True},
+}
+DEFAULT_PROFILE = os.environ.get("IMAGE_ENCODER_PROFILE", "balanced")
+JPEG_QUALITY = 95
+
+_FORMATS = {".png": "PNG", ".jpg": "JPEG", ".jpeg": "JPEG"}
+BENCHMARK_CORPUS = os.path.join("static", "uploads", "*")
+
+
+# ✅ Look up an encoding profile (default: IMAGE_ENCODER_PROFILE)
+def get_profile(name=None):
+    name = name or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"Unknown encoder profile: {name}")
+    return PROFILES[name]
+
+# ✅ Output format for a path, from its extension
+def format_for_path(path):
+    """Return "PNG" or "JPEG" for those extensions, others (".bmp") as is, "PNG" when there is none."""
+    extension = os.path.splitext(path)[1].lower()
+    if not extension:
+        return "PNG"
+    return _FORMATS.get(extension, extension)
+
+# ✅ Encode with OpenCV (expects BGR or grayscale pixels)
+def _encode_cv2(pixels, fmt, profile):
+    if fmt == "PNG":
+        extension = ".png"
+        params = [cv2.IMWRITE_PNG_COMPRESSION, profile["png_level"],
+                  cv2.IMWRITE_PNG_STRATEGY, profile.get("png_strategy", cv2.IMWRITE_PNG_STRATEGY_DEFAULT)]
+    else:
+        extension = ".jpg"
+        params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY,
+                  cv2.IMWRITE_JPEG_OPTIMIZE, int(profile["jpeg_optimize"])]
+    ok, encoded = cv2.imencode(extension, pixels, params)
+    if not ok:
+        raise ValueError(f"Could not encode image as {fmt}")
+    return encoded.tobytes()
+
+# ✅ Encode by file extension with OpenCV's defaults (expects BGR or grayscale pixels)
+def _encode_extension(pixels, extension):
+    try:
+        ok, encoded = cv2.imencode(extension, pixels)
+    except cv2.error:
+        ok = False
+    if not ok:
+        raise ValueError(f"Could not encode image as {extension}")
+    return encoded.tobytes()
+
+# ✅ Encode with PIL (expects RGB or grayscale pixels)
+def _encode_pil(pixels, fmt, profile):
+    output = io.BytesIO()
+    img = Image.fromarray(pixels)
+    if fmt == "PNG":
+        img.save(output, "PNG", compress_level=profile["png_level"], optimize=profile.get("png_optimize", False))
+    else:
+        img.save(output, "JPEG", quality=JPEG_QUALITY, optimize=profile["jpeg_optimize"])
+    return output.getvalue()
+
+# ✅ Encode a pixel array to image bytes
+def encode(pixels, fmt="PNG", profile=None, order="RGB"):
+    """Encode ``pixels`` (H x W x 3 in ``order`` "RGB" or "BGR", or H x W gray).
+
+    ``fmt`` is "PNG", "JPEG" or a file extension such as ".bmp" (see
+    format_for_path). Colour order is converted only if the backend needs
+    the other one.
+    """
+    settings = get_profile(profile)
+    if fmt not in ("PNG", "JPEG"):
+        if pixels.ndim == 3 and order != "BGR":
+            pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+        return _encode_extension(pixels, fmt)
+    backend_order = "BGR" if settings["backend"] == "cv2" else "RGB"
+    if pixels.ndim == 3 and order != backend_order:
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR if order == "RGB" else cv2.COLOR_BGR2RGB)
+    if settings["backend"] == "cv2":
+        return _encode_cv2(pixels, fmt, settings)
+    return _encode_pil(pixels, fmt, settings)
+
+# ✅ Encode a pixel array and write it to ``path``
+def save(pixels, path, fmt=None, profile=None, order="RGB"):
+    """``fmt`` defaults to the format implied by the extension of ``path``."""
+    data = encode(pixels, fmt or format_for_path(path), profile, order)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+# -------------------- BENCHMARK --------------------
+
+# ✅ Time every profile on every image
+def benchmark(paths, fmt="PNG", profiles=None, repeat=3):
+    """Return one result dict per (image, profile): best-of-``repeat`` encode time and size."""
+    results = []
+    for path in paths:
+        pixels = cv2.imread(path, cv2.IMREAD_COLOR)
+        if pixels is None:
+            continue
+        for name in profiles or PROFILES:
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = encode(pixels, fmt, name, order="BGR")
+                times.append(time.perf_counter() - start)
+            results.append({
+                "image": os.path.basename(path),
+                "pixels": int(pixels.shape[0] * pixels.shape[1]),
+                "profile": name,
+                "format": fmt,
+                "encode_ms": round(min(times) * 1000, 1),
+                "bytes": len(data),
+            })
+    return results
+
+
+def main(argv):
+    from tabulate import tabulate
+
+    as_json = "--json" in argv
+    paths = [arg for arg in argv if not arg.startswith("--")] or sorted(glob.glob(BENCHMARK_CORPUS))
+    results = benchmark(paths)
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+    rows = [[r["image"], r["profile"], r["encode_ms"], f"{r['bytes'] / 1024:.0f}"] for r in results]
+    print(tabulate(rows, headers=["Image", "Profile", "Encode (ms)", "Size (KB)"], tablefmt="grid"))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,13 +1,8 @@
 import cv2
 import numpy as np
-from PIL import Image
-from Crypto.Cipher import AES
-import base64
 import os
-
-# AES Encryption Parameters (for Steganography)
-SECRET_KEY = b"thisisasecretkey12"  # 16-character key (AES-128)
-IV = b"thisisaninitvectr"           # 16-character IV (AES-128)
+import image_encoding
+import steganography
 
 # -------------------- FILTERING FUNCTIONS --------------------
 
@@ -40,7 +35,7 @@ def apply_filter(input_path, output_path, filter_type):
             print("Error: Unknown filter type.")
             return False
 
-        cv2.imwrite(output_path, filtered_image)
+        image_encoding.save(filtered_image, output_path, order="BGR")
         return True
 
     except Exception as e:
@@ -49,59 +44,14 @@ def apply_filter(input_path, output_path, filter_type):
 
 # -------------------- STEGANOGRAPHY FUNCTIONS --------------------
 
-# Padding for AES Encryption
-def pad_message(message):
-    padding_size = 16 - (len(message) % 16)
-    return message + (chr(padding_size) * padding_size)
-
-def unpad_message(message):
-    return message[:-ord(message[-1])]
-
-# AES Encryption
-def encrypt_message(message):
-    cipher = AES.new(SECRET_KEY, AES.MODE_CBC, IV)
-    return base64.b64encode(cipher.encrypt(pad_message(message).encode())).decode()
-
-# AES Decryption
-def decrypt_message(encrypted_message):
-    try:
-        cipher = AES.new(SECRET_KEY, AES.MODE_CBC, IV)
-        return unpad_message(cipher.decrypt(base64.b64decode(encrypted_message)).decode())
-    except Exception as e:
-        return f"[ERROR] Decryption Failed: {str(e)}"
+# Path-based API kept for older callers; both functions go through the
+# unified engine (stego_engine, via steganography.py).
 
 # Hide Message in Image
 def hide_message(image_path, message):
-    encrypted_msg = encrypt_message(message)
-    img = Image.open(image_path).convert("RGB")
-    pixels = img.load()
-    binary_msg = ''.join(format(ord(char), '08b') for char in encrypted_msg)
-    
-    index = 0
-    for y in range(img.height):
-        for x in range(img.width):
-            if index < len(binary_msg):
-                r, g, b = pixels[x, y]
-                r = (r & ~1) | int(binary_msg[index])
-                pixels[x, y] = (r, g, b)
-                index += 1
-    
     hidden_img_path = image_path.replace("uploads", "filtered")
-    img.save(hidden_img_path)
-    return hidden_img_path  # Return the new image path
+    return steganography.hide_message_file(image_path, hidden_img_path, message)  # None on failure
 
 # Extract Message from Image
 def extract_message(image_path):
-    img = Image.open(image_path).convert("RGB")
-    pixels = img.load()
-    binary_msg = ""
-
-    for y in range(img.height):
-        for x in range(img.width):
-            binary_msg += str(pixels[x, y][0] & 1)
-
-    byte_array = [binary_msg[i:i+8] for i in range(0, len(binary_msg), 8)]
-    extracted_msg = ''.join(chr(int(byte, 2)) for byte in byte_array if 32 <= int(byte, 2) <= 126)
-    
-    return decrypt_message(extracted_msg)  # Decrypt and return the message
-
+    return steganography.extract_message_file(image_path)
@@ -0,0 +1,381 @@
+import atexit
+import collections
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+import uuid
+
+# Background jobs for CPU-heavy image routes.
+#
+# A route submits a job and returns its id straight away; the work runs in a
+# local worker process so 4K hide/extract/filter/verify requests no longer
+# hold Flask request threads. Clients poll ``get`` (or stream
+# ``wait_for_change``) for status and progress.
+#
+# The queue owns its worker processes (at most MAX_WORKERS, started on
+# demand) and talks to each over its own pipe: jobs go down, progress and
+# results come back. A scheduler thread hands queued jobs to idle workers and
+# enforces per-job timeouts. Python cannot interrupt a function already
+# running in a process, so cancelling or timing out a running job terminates
+# its worker; the next queued job gets a fresh one. Because each worker has a
+# private pipe, killing one cannot leave a shared lock held.
+
+MAX_WORKERS = int(os.environ.get("JOB_WORKERS", os.cpu_count() or 1))
+DEFAULT_TIMEOUT = float(os.environ.get("JOB_TIMEOUT", 120))  # seconds
+MAX_FINISHED_JOBS = 1000  # finished jobs kept for polling, oldest dropped first
+WARMUP_MODELS = os.environ.get("JOB_WARMUP_MODELS", "1") == "1"  # load face models at worker start
+_SCHEDULER_TICK = 0.5  # seconds between timeout checks
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+
+
+# -------------------- WORKER SIDE --------------------
+
+_worker_conn = None
+
+
+# Worker process main loop: run jobs received over ``conn`` until it closes
+def _worker_main(conn):
+    global _worker_conn
+    _worker_conn = conn
+    if WARMUP_MODELS:
+        import face_models
+        face_models.warmup()
+    while True:
+        try:
+            job_id, fn, args = conn.recv()
+        except EOFError:
+            return
+        report(job_id, 0.0, RUNNING)
+        try:
+            message = ("result", job_id, fn(job_id, *args))
+        except Exception as e:
+            message = ("error", job_id, str(e))
+        try:
+            conn.send(message)
+        except Exception as e:  # result that cannot be pickled
+            conn.send(("error", job_id, str(e)))
+
+
+# ✅ Report progress (0.0-1.0) of the current job from inside a worker
+def report(job_id, progress, stage):
+    if _worker_conn is not None:
+        _worker_conn.send(("progress", job_id, progress, stage))
+
+
+# ✅ Job: hide a message in an uploaded image
+def run_hide_message(job_id, filename, message, bits_per_channel, strategy, key):
+    import steganography
+    report(job_id, 0.1, "embedding")
+    stego_path = steganography.hide_message(filename, message, bits_per_channel, strategy, key)
+    if stego_path is None:
+        raise ValueError("Failed to hide message in image")
+    return {"message": "Message hidden successfully", "stego_image": os.path.basename(stego_path)}
+
+
+# ✅ Job: extract the message from an image's stego file
+def run_extract_message(job_id, filename, key):
+    import steganography
+    report(job_id, 0.1, "extracting")
+    extracted = steganography.extract_message(f"stego_{filename}", key=key)
+    if extracted.startswith("[ERROR]"):
+        raise ValueError(extracted)
+    return {"extracted_message": extracted}
+
+
+# ✅ Job: apply a filter to an uploaded image
+def run_edit_image(job_id, input_path, output_path, filter_type):
+    from image_processing import apply_filter
+    report(job_id, 0.1, "filtering")
+    if not apply_filter(input_path, output_path, filter_type):
+        raise ValueError("Failed to apply filter")
+    return {"filtered_image": os.path.basename(output_path)}
+
+
+# ✅ Job: verify a face image against the user's registered face
+def run_verify_face(job_id, user_id, image_path):
+    from face_recognition import verify_face
+    try:
+        report(job_id, 0.1, "verifying")
+        match, message = verify_face(user_id, image_path)
+    finally:
+        try:
+            os.remove(image_path)
+        except OSError:
+            pass
+    return {"verified": bool(match), "message": message}
+
+
+# -------------------- QUEUE --------------------
+
+class Job:
+    """State of one submitted job (owned by the JobQueue lock)."""
+
+    def __init__(self, kind, user_id, timeout, fn, args):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.timeout = timeout
+        self.task = (fn, args)
+        self.status = QUEUED
+        self.progress = 0.0
+        self.stage = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.version = 0  # bumped on every change, for change streaming
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": round(self.progress, 3),
+            "stage": self.stage,
+            "result": self.result,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class _Worker:
+    """One worker process, the pipe to it and the job it is running."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True,
+                                       name="jobs-worker")
+        self.process.start()
+        child_conn.close()
+        self.job = None
+
+
+class JobQueue:
+    """In-process job table in front of a set of killable worker processes."""
+
+    def __init__(self, max_workers=MAX_WORKERS):
+        self.max_workers = max_workers
+        self.jobs = {}
+        self.pending = collections.deque()  # submitted jobs not yet handed to a worker
+        self.workers = []
+        self.retired = []  # terminated workers not yet reaped
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.context = multiprocessing.get_context()
+        self.scheduler = None
+        self.wakeup_reader = self.wakeup_writer = None
+
+    # Start the scheduler thread on first use
+    def _start(self):
+        if self.scheduler is not None:
+            return
+        self.wakeup_reader, self.wakeup_writer = self.context.Pipe(duplex=False)
+        self.scheduler = threading.Thread(target=self._schedule, args=(self.wakeup_reader,),
+                                          daemon=True, name="jobs-scheduler")
+        self.scheduler.start()
+
+    def _wake(self):
+        self.wakeup_writer.send(None)
+
+    def _touch(self, job):
+        job.version += 1
+        self.changed.notify_all()
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.stage = status
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        if status == SUCCEEDED:
+            job.progress = 1.0
+        self._touch(job)
+        self._prune()
+
+    # Drop the oldest finished jobs beyond MAX_FINISHED_JOBS
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.status in FINISHED_STATES]
+        if len(finished) > MAX_FINISHED_JOBS:
+            finished.sort(key=lambda job: job.finished)
+            for job in finished[:len(finished) - MAX_FINISHED_JOBS]:
+                del self.jobs[job.id]
+
+    # Kill a worker and forget it; the scheduler starts another when needed
+    def _retire(self, worker):
+        if worker in self.workers:
+            self.workers.remove(worker)
+            self.retired.append(worker)
+        worker.job = None
+        worker.process.terminate()
+
+    # Reap retired workers that have exited
+    def _reap(self):
+        for worker in [w for w in self.retired if not w.process.is_alive()]:
+            self.retired.remove(worker)
+            worker.conn.close()
+
+    # Finish a job that has not completed, freeing its worker if it has one
+    def _abort(self, job, status, error=None):
+        self._finish(job, status, error=error)
+        for worker in self.workers:
+            if worker.job is job:
+                self._retire(worker)
+                self._wake()
+                break
+
+    # Hand queued jobs to idle workers, starting workers up to max_workers
+    def _dispatch(self):
+        while self.pending:
+            job = self.pending[0]
+            if job.status in FINISHED_STATES:
+                self.pending.popleft()  # cancelled or timed out while queued
+                continue
+            worker = next((w for w in self.workers if w.job is None), None)
+            if worker is None:
+                if len(self.workers) >= self.max_workers:
+                    return
+                worker = _Worker(self.context)
+                self.workers.append(worker)
+            fn, args = job.task
+            try:
+                worker.conn.send((job.id, fn, args))
+            except OSError:
+                self._retire(worker)  # died while idle; the job stays queued
+                continue
+            self.pending.popleft()
+            worker.job = job
+
+    # Time out jobs that have been running (or waiting) too long
+    def _expire(self):
+        now = time.time()
+        for job in list(self.jobs.values()):
+            if job.status in FINISHED_STATES or not job.timeout:
+                continue
+            if now - (job.started or job.created) > job.timeout:
+                self._abort(job, TIMED_OUT, error=f"Job exceeded {job.timeout:g}s timeout")
+
+    # Apply one message sent by a worker
+    def _handle(self, worker, message):
+        kind, job_id = message[0], message[1]
+        job = worker.job
+        if job is None or job.id != job_id:
+            return
+        if kind == "progress":
+            if job.status == QUEUED:
+                job.status = RUNNING
+                job.started = time.time()
+            job.progress = max(job.progress, message[2])
+            job.stage = message[3]
+            self._touch(job)
+            return
+        worker.job = None
+        if kind == "result":
+            self._finish(job, SUCCEEDED, result=message[2])
+        else:
+            self._finish(job, FAILED, error=message[2])
+
+    # Read everything a worker has sent; retire it if it has exited
+    def _collect(self, worker):
+        try:
+            while worker.conn.poll():
+                self._handle(worker, worker.conn.recv())
+            if worker.process.is_alive():
+                return
+        except (EOFError, OSError):
+            pass
+        job = worker.job
+        self._retire(worker)
+        if job is not None and job.status not in FINISHED_STATES:
+            self._finish(job, FAILED, error="Worker process exited unexpectedly")
+
+    # Scheduler thread: dispatch, enforce timeouts and collect worker messages
+    def _schedule(self, wakeup):
+        while True:
+            with self.lock:
+                if self.scheduler is not threading.current_thread():
+                    return  # shut down
+                self._reap()
+                self._expire()
+                self._dispatch()
+                handles = {}
+                for worker in self.workers:
+                    handles[worker.conn] = worker
+                    handles[worker.process.sentinel] = worker
+            ready = multiprocessing.connection.wait([wakeup, *handles], timeout=_SCHEDULER_TICK)
+            with self.lock:
+                while wakeup.poll():
+                    wakeup.recv()
+                for worker in {handles[handle] for handle in ready if handle is not wakeup}:
+                    self._collect(worker)
+
+    # ✅ Submit ``fn(job_id, *args)`` to the workers and return the job id
+    def submit(self, kind, user_id, fn, *args, timeout=DEFAULT_TIMEOUT):
+        with self.lock:
+            self._start()
+            job = Job(kind, user_id, timeout, fn, args)
+            self.jobs[job.id] = job
+            self.pending.append(job)
+            self._wake()
+        return job.id
+
+    # ✅ Snapshot of a job's state, or None (also None for another user's job)
+    def get(self, job_id, user_id=None):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or (user_id is not None and job.user_id != user_id):
+                return None
+            return job.to_dict()
+
+    # ✅ Cancel a job (terminating its worker if running); returns its state, or None if unknown
+    def cancel(self, job_id, user_id=None):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or (user_id is not None and job.user_id != user_id):
+                return None
+            if job.status not in FINISHED_STATES:
+                self._abort(job, CANCELLED)
+            return job.to_dict()
+
+    # ✅ Block until a job changes after ``version`` (or ``timeout`` passes)
+    def wait_for_change(self, job_id, version, timeout=15.0):
+        """Return ``(state, version)``; ``state`` is None if the job is gone."""
+        with self.lock:
+            self.changed.wait_for(
+                lambda: job_id not in self.jobs or self.jobs[job_id].version != version, timeout)
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None, version
+            return job.to_dict(), job.version
+
+    # ✅ Stop the workers, cancelling unfinished jobs (also registered at interpreter exit)
+    def shutdown(self):
+        with self.lock:
+            if self.scheduler is None:
+                return
+            for job in list(self.jobs.values()):
+                if job.status not in FINISHED_STATES:
+                    self._finish(job, CANCELLED)
+            for worker in list(self.workers):
+                self._retire(worker)
+            retired, self.retired = self.retired, []
+            self.pending.clear()
+            self._wake()
+            self.scheduler = None
+        for worker in retired:
+            worker.process.join(timeout=1)
+
+
+job_queue = JobQueue()
+atexit.register(job_queue.shutdown)
@@ -111,57 +111,40 @@ def calculate_steganography_metrics():
     return capacity_bpp, psnr, mse
 
 def calculate_embedding_speed():
-    """Calculate embedding and extraction speed metrics"""
-    print("\nCALCULATING EMBEDDING SPEED METRICS")
+    """Measure embedding and extraction speed with the stego benchmark suite"""
+    print("\nMEASURING EMBEDDING SPEED")
     print("-" * 50)
-    
-    # Simulate embedding speeds for different sizes
-    image_sizes = ['512×512', '1024×1024', '2048×2048', '3840×2160']
-    pixel_counts = [512*512, 1024*1024, 2048*2048, 3840*2160]
-    
-    # Time complexity coefficient (ms per million pixels)
-    coefficient = 0.33  # Calculated from real tests
-    
-    # Calculate times
-    times = []
-    for pixels in pixel_counts:
-        # Base time + pixels-based scaling
-        time_ms = 5 + (pixels / 1000000) * coefficient * 1000
-        times.append(int(time_ms))
-    
-    # Print calculation steps
-    print("EMBEDDING SPEED CALCULATION:")
-    print(f"Time complexity: ~{coefficient:.2f} ms per million pixels + 5 ms base time")
-    
-    speed_table = [["Image Size", "Pixel Count", "Calculation", "Time (ms)"]]
-    for i, size in enumerate(image_sizes):
-        calculation = f"5 + ({pixel_counts[i]}/1000000 * {coefficient*1000:.1f}) = {times[i]}"
-        speed_table.append([size, f"{pixel_counts[i]:,}", calculation, times[i]])
-    
+
+    import stego_benchmark
+
+    # Sequential 1-LSB, 1 KB message, as in the paper; see stego_benchmark.py for the full matrix
+    report = stego_benchmark.run(stego_benchmark.COVER_SIZES, strategies=["sequential"],
+                                 payloads=[1024], repeats=3, warmup=1, log=lambda line: None)
+    results = report["results"]
+    times = [int(round(r["embed_ms"]["p50"])) for r in results]
+
+    speed_table = [["Image Size", "Pixel Count", "Embed p50 (ms)", "Embed p90 (ms)",
+                    "Extract p50 (ms)", "Extract p90 (ms)", "Peak Memory (MB)"]]
+    for r in results:
+        speed_table.append([f"{r['width']}×{r['height']}", f"{r['pixels']:,}",
+                            r["embed_ms"]["p50"], r["embed_ms"]["p90"],
+                            r["extract_ms"]["p50"], r["extract_ms"]["p90"], r["embed_ms"]["peak_mb"]])
+
+    print("MEASURED (hide_message_file / extract_message_file, caches disabled):")
     print(tabulate(speed_table, headers="firstrow", tablefmt="grid"))
-    
-    # Compare with actual paper values
+
+    # Compare with the values reported in the paper
     paper_times = [87, 254, 863, 1643]
-    
-    comparison = [["Image Size", "Calculated Time (ms)", "Paper Time (ms)", "Difference"]]
-    for i, size in enumerate(image_sizes):
-        diff = paper_times[i] - times[i]
-        comparison.append([size, times[i], paper_times[i], f"{diff:+d} ms ({diff/paper_times[i]*100:.1f}%)"]) 
-    
+
+    comparison = [["Image Size", "Measured Time (ms)", "Paper Time (ms)", "Difference"]]
+    for r, measured, paper in zip(results, times, paper_times):
+        diff = measured - paper
+        comparison.append([f"{r['width']}×{r['height']}", measured, paper, f"{diff:+d} ms ({diff/paper*100:.1f}%)"])
+
     print("\nCOMPARISON WITH PAPER VALUES:")
     print(tabulate(comparison, headers="firstrow", tablefmt="grid"))
-    
-    # Calculate extraction times (usually faster)
-    extraction_times = [int(t * 0.8) for t in paper_times]
-    
-    print("\nEXTRACTION TIMES (typically 20% faster than embedding):")
-    extract_table = [["Image Size", "Embedding Time (ms)", "Extraction Time (ms)"]]
-    for i, size in enumerate(image_sizes):
-        extract_table.append([size, paper_times[i], extraction_times[i]])
-    
-    print(tabulate(extract_table, headers="firstrow", tablefmt="grid"))
-    
-    return paper_times
+
+    return times
 
 def calculate_system_response_time():
     """Calculate overall system response time"""
@@ -0,0 +1,136 @@
+import struct
+import zlib
+import numpy as np
+
+# Progressive PNG decoding in row bands.
+#
+# PIL decodes a PNG into one full frame before any pixel can be read. For the
+# steganography extractor only the first rows of the image usually matter, so
+# this reader inflates the IDAT stream incrementally and reconstructs rows on
+# demand, keeping at most one band (plus the previous row) in memory.
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+DEFAULT_BAND_ROWS = 16
+_INFLATE_STEP = 1 << 20  # max bytes inflated per zlib call
+
+# Colour types we can stream: 2 = RGB, 6 = RGBA (8 bits per sample)
+_CHANNELS = {2: 3, 6: 4}
+
+
+class UnsupportedPNG(ValueError):
+    """Raised when a file is not a PNG this reader can stream."""
+
+
+# ✅ Read PNG chunks one at a time
+def _iter_chunks(f):
+    while True:
+        head = f.read(8)
+        if len(head) < 8:
+            return
+        length, chunk_type = struct.unpack(">I4s", head)
+        data = f.read(length)
+        f.read(4)  # CRC; zlib validates the image data stream itself
+        yield chunk_type, data
+        if chunk_type == b"IEND":
+            return
+
+
+# ✅ Undo the Average filter (sequential by definition)
+def _unfilter_average(raw, prior, bpp):
+    out = bytearray(raw)
+    for i in range(bpp):
+        out[i] = (out[i] + (prior[i] >> 1)) & 0xFF
+    for i in range(bpp, len(out)):
+        out[i] = (out[i] + ((out[i - bpp] + prior[i]) >> 1)) & 0xFF
+    return out
+
+
+# ✅ Undo the Paeth filter (sequential by definition)
+def _unfilter_paeth(raw, prior, bpp):
+    out = bytearray(raw)
+    for i in range(bpp):
+        out[i] = (out[i] + prior[i]) & 0xFF
+    for i in range(bpp, len(out)):
+        a = out[i - bpp]
+        b = prior[i]
+        c = prior[i - bpp]
+        p = a + b - c
+        pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+        if pa <= pb and pa <= pc:
+            predictor = a
+        elif pb <= pc:
+            predictor = b
+        else:
+            predictor = c
+        out[i] = (out[i] + predictor) & 0xFF
+    return out
+
+
+# ✅ Reconstruct one scanline from its filtered bytes
+def _unfilter_row(filter_type, raw, prior, bpp):
+    if filter_type == 0:
+        return raw
+    if filter_type == 1:
+        pixels = raw.reshape(-1, bpp)
+        return np.cumsum(pixels, axis=0, dtype=np.uint8).reshape(-1)
+    if filter_type == 2:
+        return raw + prior
+    if filter_type == 3:
+        return np.frombuffer(_unfilter_average(raw.tobytes(), prior.tobytes(), bpp), dtype=np.uint8)
+    if filter_type == 4:
+        return np.frombuffer(_unfilter_paeth(raw.tobytes(), prior.tobytes(), bpp), dtype=np.uint8)
+    raise UnsupportedPNG(f"Unknown PNG filter type {filter_type}")
+
+
+# ✅ Yield the image as RGB row bands
+def iter_png_bands(path, band_rows=DEFAULT_BAND_ROWS):
+    """Yield ``(rows, width, 3)`` uint8 RGB arrays covering ``path`` top to bottom.
+
+    Only 8-bit, non-interlaced RGB/RGBA PNGs are supported; anything else
+    raises ``UnsupportedPNG`` before any pixel data is read, so callers can
+    fall back to a full PIL decode. Closing the generator early stops reading
+    the file.
+    """
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise UnsupportedPNG("Not a PNG file")
+
+        chunks = _iter_chunks(f)
+        chunk_type, data = next(chunks, (None, b""))
+        if chunk_type != b"IHDR":
+            raise UnsupportedPNG("Missing IHDR chunk")
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", data)
+        if bit_depth != 8 or color_type not in _CHANNELS or interlace:
+            raise UnsupportedPNG("Only 8-bit non-interlaced RGB/RGBA PNGs can be streamed")
+
+        bpp = _CHANNELS[color_type]
+        stride = width * bpp + 1
+        inflater = zlib.decompressobj()
+        pending = bytearray()
+        prior = np.zeros(width * bpp, dtype=np.uint8)
+        band = []
+        rows_done = 0
+
+        for chunk_type, data in chunks:
+            if chunk_type != b"IDAT":
+                continue
+            while data:
+                pending += inflater.decompress(data, _INFLATE_STEP)
+                data = inflater.unconsumed_tail
+
+                while len(pending) >= stride and rows_done < height:
+                    filter_type = pending[0]
+                    raw = np.frombuffer(bytes(pending[1:stride]), dtype=np.uint8)
+                    del pending[:stride]
+                    prior = _unfilter_row(filter_type, raw, prior, bpp)
+                    band.append(prior.reshape(width, bpp)[:, :3])
+                    rows_done += 1
+
+                    if len(band) == band_rows:
+                        yield np.stack(band)
+                        band = []
+
+        if band:
+            yield np.stack(band)
+        if rows_done < height:
+            raise ValueError("Truncated PNG image data")
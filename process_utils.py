@@ -0,0 +1,48 @@
+import atexit
+import multiprocessing.util
+import os
+import threading
+
+# Helpers for objects that run one background thread per process (the face
+# metrics flusher and the face operation log writer).
+
+
+class OncePerProcess:
+    """Run ``start`` once in each process that calls ``ensure``, and ``on_exit`` when that process exits.
+
+    ``reset`` runs in forked children right after the fork, so a child
+    starts with fresh per-process state and its own thread instead of the
+    parent's (which does not exist in the child).
+    """
+
+    def __init__(self, start, on_exit, reset=None):
+        self.start = start
+        self.on_exit = on_exit
+        self.reset = reset
+        self.lock = threading.Lock()
+        self.pid = None  # process ``start`` last ran in
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self.lock = threading.Lock()
+        self.pid = None
+        if self.reset is not None:
+            self.reset()
+
+    # ✅ Whether ``start`` has run in the current process
+    def started(self):
+        return self.pid == os.getpid()
+
+    # ✅ Run ``start`` unless it already ran in this process (cheap when it has)
+    def ensure(self):
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.start()
+        # atexit does not run in multiprocessing children; their finalizers do
+        atexit.register(self.on_exit)
+        multiprocessing.util.Finalize(self, self.on_exit, exitpriority=10)
@@ -1,8 +1,24 @@
 from PIL import Image
+import numpy as np
+import cv2
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import pad, unpad
 import base64
+import contextlib
+import hashlib
+import hmac
+import io
+import itertools
+import lzma
 import os
+import struct
+import zlib
+import file_utils
+import image_encoding
+import png_stream
+import stego_cache
+import stego_dct
+import stego_engine
 
 # AES Configuration
 SECRET_KEY = b"this_is_a_32_byte_secret_key_123"  # 32 bytes key
@@ -29,95 +45,519 @@ def decrypt_message(encrypted_bytes):
     except Exception as e:
         return f"[Decryption Error] {str(e)}"
 
-# ✅ Hide message inside image using LSB steganography
-def hide_message(image_filename, message):
+# Payload envelope (stego_engine payload formats 4-6):
+#
+#   nonce (8 bytes, clear) | AES-256-CTR( "SPPK" | kind (1) | name length (2) | name | data )
+#
+# CTR mode needs no padding and encrypts chunk by chunk, so file payloads are
+# read, encrypted and embedded one chunk at a time. The cipher key is derived
+# per message from the caller's key (see stego_keys) and the random nonce;
+# the "SPPK" check value rejects a wrong key before any data is decrypted.
+#
+# ``data`` is compressed before encryption (ciphertext does not compress); the
+# codec is recorded in the stego header as payload format 4 + codec id.
+#
+# Images written by the original marker-framed hide_message carry no header;
+# their AES-CBC payload under SECRET_KEY is read with decrypt_message.
+PAYLOAD_FORMAT_ENVELOPE = 4
+CODEC_NONE = 0
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+PAYLOAD_TEXT = 0
+PAYLOAD_FILE = 1
+_NONCE_BYTES = 8
+_KEY_CHECK = b"SPPK"
+_ENVELOPE_HEADER = struct.Struct(">4sBH")
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+# Raised by open_envelope when the payload was sealed with another key
+class WrongKey(ValueError):
+    pass
+
+# Largest message or file (after decompression) hidden or extracted; bounds
+# decompression bombs. Matches the app's 16 MB upload limit.
+MAX_PLAINTEXT_BYTES = int(os.environ.get("STEGO_MAX_PLAINTEXT_BYTES", 16 * 1024 * 1024))
+
+# Raw streams: the stego header already carries length and CRC-32
+_LZMA_FILTERS = [{"id": lzma.FILTER_LZMA2, "preset": 6}]
+_COMPRESSORS = {
+    CODEC_ZLIB: lambda: zlib.compressobj(9, zlib.DEFLATED, -15),
+    CODEC_LZMA: lambda: lzma.LZMACompressor(lzma.FORMAT_RAW, filters=_LZMA_FILTERS),
+}
+_DECOMPRESSORS = {
+    CODEC_ZLIB: lambda: zlib.decompressobj(-15),
+    CODEC_LZMA: lambda: lzma.LZMADecompressor(lzma.FORMAT_RAW, filters=_LZMA_FILTERS),
+}
+
+# ✅ Compress a stream of chunks with ``codec``
+def compress_chunks(codec, chunks):
+    if codec == CODEC_NONE:
+        yield from chunks
+        return
+    compressor = _COMPRESSORS[codec]()
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+# ✅ Decompress a stream of chunks written by ``compress_chunks``
+def decompress_chunks(codec, chunks, max_output=MAX_PLAINTEXT_BYTES):
+    """Raises ValueError as soon as the output would exceed ``max_output`` bytes."""
+    total = 0
+    if codec == CODEC_NONE:
+        for chunk in chunks:
+            total += len(chunk)
+            if total > max_output:
+                raise ValueError("Hidden data exceeds the size limit")
+            yield chunk
+        return
+    decompressor = _DECOMPRESSORS[codec]()
+    for chunk in chunks:
+        while True:
+            # Never ask for more than one byte past the limit
+            out = decompressor.decompress(chunk, max_output - total + 1)
+            total += len(out)
+            if total > max_output:
+                raise ValueError("Hidden data exceeds the size limit")
+            if out:
+                yield out
+            if codec == CODEC_ZLIB:
+                chunk = decompressor.unconsumed_tail
+                if not chunk:
+                    break
+            else:
+                chunk = b""
+                if decompressor.needs_input or decompressor.eof:
+                    break
+    if codec == CODEC_ZLIB:
+        out = decompressor.flush()
+        if total + len(out) > max_output:
+            raise ValueError("Hidden data exceeds the size limit")
+        yield out
+
+# ✅ Pass chunks through, failing once more than ``limit`` bytes have been read
+def _limit_chunks(chunks, limit=MAX_PLAINTEXT_BYTES):
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if total > limit:
+            raise ValueError("File exceeds the size limit")
+        yield chunk
+
+# ✅ Try every codec on ``data`` and keep the smallest result
+def compress_best(data):
+    """Return ``(codec, compressed)``; ties go to CODEC_NONE."""
+    best = (CODEC_NONE, data)
+    for codec in (CODEC_ZLIB, CODEC_LZMA):
+        compressed = b"".join(compress_chunks(codec, [data]))
+        if len(compressed) < len(best[1]):
+            best = (codec, compressed)
+    return best
+
+# ✅ Bytes the envelope adds around a payload named ``filename``
+def envelope_overhead(filename=""):
+    return _NONCE_BYTES + _ENVELOPE_HEADER.size + len(filename.encode('utf-8'))
+
+# ✅ CTR cipher for one message: a fresh key per (caller key, nonce)
+def _message_cipher(key, nonce):
+    message_key = hmac.new(key, b"spp-message:" + nonce, hashlib.sha256).digest()
+    return AES.new(message_key, AES.MODE_CTR, nonce=nonce)
+
+# ✅ Encrypt ``chunks`` into envelope pieces, one output piece per input chunk
+def seal_envelope(kind, filename, chunks, key=SECRET_KEY):
+    nonce = os.urandom(_NONCE_BYTES)
+    cipher = _message_cipher(key, nonce)
+    name = filename.encode('utf-8')
+    yield nonce + cipher.encrypt(_ENVELOPE_HEADER.pack(_KEY_CHECK, kind, len(name)) + name)
+    for chunk in chunks:
+        yield cipher.encrypt(chunk)
+
+# ✅ Decrypt an envelope from a stego_engine.PayloadStream
+def open_envelope(stream, key=SECRET_KEY):
+    """Return ``(kind, filename, chunks)`` where ``chunks`` yields plaintext.
+
+    ``chunks`` is decompressed with the codec recorded in the payload
+    format; the payload checksum is verified when it is exhausted. Raises
+    WrongKey if ``key`` is not the one the payload was sealed with.
+    """
+    chunks = stream.chunks()
+    head = b""
+    while len(head) < _NONCE_BYTES + _ENVELOPE_HEADER.size:
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Truncated payload")
+        head += chunk
+    cipher = _message_cipher(key, head[:_NONCE_BYTES])
+    plain = cipher.decrypt(head[_NONCE_BYTES:])
+    check, kind, name_length = _ENVELOPE_HEADER.unpack_from(plain)
+    if check != _KEY_CHECK:
+        raise WrongKey("Wrong key for this image")
+    codec = stream.payload_format - PAYLOAD_FORMAT_ENVELOPE
+    data_start = _ENVELOPE_HEADER.size + name_length
+    while len(plain) < data_start:
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Truncated payload")
+        plain += cipher.decrypt(chunk)
+    filename = plain[_ENVELOPE_HEADER.size:data_start].decode('utf-8')
+
+    def data():
+        if len(plain) > data_start:
+            yield plain[data_start:]
+        for chunk in chunks:
+            yield cipher.decrypt(chunk)
+    return kind, filename, decompress_chunks(codec, data())
+
+# ✅ Whether a payload format is an envelope this module can open
+def _is_envelope(payload_format):
+    return PAYLOAD_FORMAT_ENVELOPE <= payload_format <= PAYLOAD_FORMAT_ENVELOPE + CODEC_LZMA
+
+# ✅ Reject headered payloads that are not envelopes
+def _check_payload_format(stream):
+    if stream.strategy != stego_engine.LegacyMarkerReader.name and not _is_envelope(stream.payload_format):
+        raise ValueError(f"Unsupported payload format {stream.payload_format}")
+
+# ✅ Encrypt and embed an envelope of ``codec``-compressed chunks into an RGB array
+def _embed_envelope(pixels, kind, filename, chunks, codec, bits_per_channel, strategy, key):
+    writer = stego_engine.PayloadWriter(pixels, bits_per_channel, strategy, key,
+                                        PAYLOAD_FORMAT_ENVELOPE + codec)
+    for piece in seal_envelope(kind, filename, chunks, key):
+        writer.write(piece)
+    return writer.close()
+
+# ✅ Encrypt an envelope into the DCT domain of a PIL image and return the stego JPEG bytes
+def _encode_dct_envelope(img, kind, filename, chunks, codec, key):
+    sealed = b"".join(seal_envelope(kind, filename, chunks, key))
+    return stego_dct.encode_jpeg(img, sealed, PAYLOAD_FORMAT_ENVELOPE + codec)
+
+# ✅ Whether an embedding mode writes JPEG output
+def writes_jpeg(strategy):
+    return strategy == stego_dct.DctQIM.name
+
+# ✅ Reject bits-per-channel modes a strategy cannot use
+def _valid_mode(bits_per_channel, strategy):
+    if strategy not in stego_engine.embedding_strategies():
+        return False
+    return bits_per_channel in stego_engine.get_strategy(strategy).bits_per_channel_choices
+
+# ✅ Decrypt the text message held by a payload stream
+def _read_text(stream, key):
+    _check_payload_format(stream)
+    if not _is_envelope(stream.payload_format):
+        return decrypt_message(stream.read().data)
+    kind, filename, data = open_envelope(stream, key)
+    if kind != PAYLOAD_TEXT:
+        return f"[ERROR] Image holds a file ({filename}), not a message"
+    return b"".join(data).decode('utf-8')
+
+# Images at least this large are extracted by streaming PNG row bands, unless
+# the payload reaches past this fraction of the rows: rows stored with the
+# Average or Paeth filter are rebuilt in Python, about 12x slower per row than
+# a full decode by PIL, so long payloads are read faster from a full decode
+STREAMING_MIN_PIXELS = 8 * 1024 * 1024
+STREAMING_MAX_ROW_FRACTION = 1 / 16
+
+# ✅ Key for payload encryption and scatter order when the caller gives none
+def _user_key(key):
+    return key or SECRET_KEY
+
+# ✅ Message length (UTF-8 bytes) guaranteed to fit a cover, per embedding mode (compressible text may be longer)
+def capacity_for_size(width, height):
+    """Return ``{strategy: {bits_per_channel: bytes}}`` for every strategy that can embed."""
+    capacity = {}
+    for strategy in stego_engine.embedding_strategies():
+        capacity[strategy] = {}
+        for bits_per_channel in stego_engine.get_strategy(strategy).bits_per_channel_choices:
+            payload = stego_engine.payload_capacity(width, height, bits_per_channel, strategy)
+            capacity[strategy][bits_per_channel] = max(payload - envelope_overhead(), 0)
+    return capacity
+
+# ✅ Capacity of an image file, read from its header without decoding pixels
+def image_capacity(img_path):
+    with Image.open(img_path) as img:
+        width, height = img.size
+    return {"width": width, "height": height, "capacity": capacity_for_size(width, height)}
+
+# ✅ Reference per-pixel embedding (kept for validating stego_engine.embed_bits)
+def embed_bits_reference(img, binary_message):
+    """Embed a '0'/'1' string into a PIL RGB image in place, pixel by pixel."""
+    pixels = img.load()
+    width, height = img.size
+    idx = 0
+    for y in range(height):
+        for x in range(width):
+            if idx >= len(binary_message):
+                break
+            r, g, b = pixels[x, y]
+            r = (r & ~1) | int(binary_message[idx]) if idx < len(binary_message) else r
+            idx += 1
+            g = (g & ~1) | int(binary_message[idx]) if idx < len(binary_message) else g
+            idx += 1
+            b = (b & ~1) | int(binary_message[idx]) if idx < len(binary_message) else b
+            idx += 1
+            pixels[x, y] = (r, g, b)
+    return img
+
+# ✅ Hide message in an image file and write the stego image
+def hide_message_file(img_path, stego_path, message, bits_per_channel=1, strategy="sequential",
+                      key=None, reference=False, use_cache=True):
+    """Hide ``message`` in the image at ``img_path`` and save the result to ``stego_path``.
+
+    ``bits_per_channel`` (1-4) selects how many low bits of each colour
+    channel carry payload and ``strategy`` names a registered stego_engine
+    strategy ("sequential", "scatter" for a pixel order derived from
+    ``key``, or "adaptive" for the most textured pixels first). ``key`` (a per-user key from stego_keys, default SECRET_KEY)
+    also encrypts the message; ``reference=True`` uses the per-pixel
+    sequential 1-bit path. The "dct" strategy writes a JPEG (whatever the
+    extension of ``stego_path``); every other strategy writes a PNG. Repeat
+    requests for the same cover content, message and mode are served from the
+    stego cache unless ``use_cache`` is False. Returns ``stego_path``, or None
+    on failure.
+    """
     try:
-        encrypted_data = encrypt_message(message)
-        if encrypted_data is None:
+        if not _valid_mode(bits_per_channel, strategy):
             return None
+        if reference and (bits_per_channel != 1 or strategy != "sequential"):
+            return None
+        key = _user_key(key)
+        if len(message.encode('utf-8')) > MAX_PLAINTEXT_BYTES:
+            return None  # Message too large to extract again
+
+        # Reuse a previously written artifact for identical inputs
+        cache_key = None
+        if use_cache and not reference:
+            cache_key = stego_cache.cache_key(img_path, message.encode('utf-8'),
+                                              f"{strategy}-lsb{bits_per_channel}",
+                                              hashlib.sha256(key).hexdigest())
+            if stego_cache.stego_cache.fetch(cache_key, stego_path):
+                stego_cache.extraction_cache.invalidate(stego_path)
+                return stego_path
+
+        codec, data = compress_best(message.encode('utf-8'))
 
         # Load image
-        img_path = os.path.join("static", "uploads", image_filename)
         img = Image.open(img_path).convert("RGB")
-        pixels = img.load()
         width, height = img.size
 
-        # Convert encrypted data to binary
-        binary_data = ''.join(format(byte, '08b') for byte in encrypted_data)
+        # Check if the compressed message fits in image
+        if len(data) + envelope_overhead() > stego_engine.payload_capacity(width, height, bits_per_channel, strategy):
+            return None  # Message too large
 
-        # Add start and end markers
-        start_marker = '1111111111111111'
-        end_marker = '1111111111111110'
-        binary_message = start_marker + binary_data + end_marker
+        # Hide header and encrypted payload into DCT coefficients (JPEG output)
+        if writes_jpeg(strategy):
+            with open(stego_path, "wb") as f:
+                f.write(_encode_dct_envelope(img, PAYLOAD_TEXT, "", [data], codec, key))
 
-        # Check if message fits in image
-        if len(binary_message) > width * height * 3:
-            return None  # Message too large
+        # Hide header and encrypted payload into the low bits of image pixels
+        elif reference:
+            sealed = b"".join(seal_envelope(PAYLOAD_TEXT, "", [data], key))
+            bitstream = stego_engine.build_bitstream(sealed, PAYLOAD_FORMAT_ENVELOPE + codec)
+            embed_bits_reference(img, ''.join(map(str, bitstream)))
+            image_encoding.save(np.asarray(img), stego_path, "PNG")
+        else:
+            pixels = np.array(img)
+            _embed_envelope(pixels, PAYLOAD_TEXT, "", [data], codec, bits_per_channel, strategy, key)
+            image_encoding.save(pixels, stego_path, "PNG")
 
-        # Hide bits into LSBs of image pixels
-        idx = 0
-        for y in range(height):
-            for x in range(width):
-                if idx >= len(binary_message):
-                    break
-                r, g, b = pixels[x, y]
-                r = (r & ~1) | int(binary_message[idx]) if idx < len(binary_message) else r
-                idx += 1
-                g = (g & ~1) | int(binary_message[idx]) if idx < len(binary_message) else g
-                idx += 1
-                b = (b & ~1) | int(binary_message[idx]) if idx < len(binary_message) else b
-                idx += 1
-                pixels[x, y] = (r, g, b)
-
-        # Save the stego image
-        stego_path = os.path.join("static", "filtered", f"stego_{image_filename}")
-        img.save(stego_path, "PNG")
+        stego_cache.extraction_cache.invalidate(stego_path)
+        if cache_key is not None:
+            stego_cache.stego_cache.store(cache_key, stego_path)
         return stego_path
 
     except Exception as e:
         print(f"[Hiding Error] {str(e)}")
         return None
 
-# ✅ Extract message from image using LSB steganography
-def extract_message(image_filename):
+# ✅ Hide message inside image using LSB steganography
+def hide_message(image_filename, message, bits_per_channel=1, strategy="sequential",
+                 key=None, reference=False, use_cache=True):
+    """Hide ``message`` in ``static/uploads/<image_filename>``; see ``hide_message_file``."""
+    img_path = os.path.join("static", "uploads", image_filename)
+    stego_path = os.path.join("static", "filtered", f"stego_{image_filename}")
+    return hide_message_file(img_path, stego_path, message, bits_per_channel, strategy,
+                             key, reference, use_cache)
+
+# ✅ Hide an uploaded file in an image file and write the stego image
+def hide_file(img_path, stego_path, fileobj, filename, bits_per_channel=1, strategy="sequential", key=None):
+    """Hide the contents of the binary file object ``fileobj`` in ``img_path``.
+
+    The file is read, compressed, encrypted and embedded in FILE_CHUNK_BYTES
+    chunks; the codec is the one that does best on the first chunk.
+    ``filename`` is stored (encrypted) alongside it. As with
+    ``hide_message_file`` the "dct" strategy writes a JPEG. Returns
+    ``stego_path``, or None on failure (including a file too large for the
+    cover).
+    """
     try:
-        img_path = os.path.join("static", "filtered", image_filename)
-        img = Image.open(img_path).convert("RGB")
-        pixels = img.load()
-        width, height = img.size
+        if not _valid_mode(bits_per_channel, strategy):
+            return None
 
-        bits = ""
-        start_marker = '1111111111111111'
-        end_marker = '1111111111111110'
+        img = Image.open(img_path).convert("RGB")
+        first = fileobj.read(FILE_CHUNK_BYTES)
+        codec = compress_best(first)[0]
+        chunks = itertools.chain([first], iter(lambda: fileobj.read(FILE_CHUNK_BYTES), b""))
+        chunks = compress_chunks(codec, _limit_chunks(chunks))
 
-        # Extract all LSBs
-        for y in range(height):
-            for x in range(width):
-                for channel in pixels[x, y]:
-                    bits += str(channel & 1)
+        if writes_jpeg(strategy):
+            with open(stego_path, "wb") as f:
+                f.write(_encode_dct_envelope(img, PAYLOAD_FILE, filename, chunks, codec, _user_key(key)))
+        else:
+            pixels = np.array(img)
+            _embed_envelope(pixels, PAYLOAD_FILE, filename, chunks, codec,
+                            bits_per_channel, strategy, _user_key(key))
+            image_encoding.save(pixels, stego_path, "PNG")
+        stego_cache.extraction_cache.invalidate(stego_path)
+        return stego_path
 
-        # Find markers
-        start_index = bits.find(start_marker)
-        if start_index == -1:
-            return "[ERROR] Start marker not found"
-        start_index += len(start_marker)
+    except Exception as e:
+        print(f"[Hiding Error] {str(e)}")
+        return None
 
-        end_index = bits.find(end_marker, start_index)
-        if end_index == -1:
-            return "[ERROR] End marker not found"
+# ✅ Open the payload of an image file, streaming PNG row bands when worthwhile
+@contextlib.contextmanager
+def _open_payload_stream(img_path, streaming, key):
+    automatic = streaming is None
+    if automatic:
+        with Image.open(img_path) as img:
+            width, height = img.size
+        streaming = width * height >= STREAMING_MIN_PIXELS
+    if streaming:
+        reader = stego_engine.open_band_reader(img_path)
+        try:
+            stream = stego_engine.open_payload(reader, key)
+        except (png_stream.UnsupportedPNG, stego_engine.StreamingUnsupported):
+            reader.close()
+            stream = None
+        except Exception:
+            reader.close()
+            raise
+        if (automatic and stream is not None and stream.data is None
+                and stream.end_channel() > STREAMING_MAX_ROW_FRACTION * width * height * 3):
+            reader.close()
+            stream = None
+        if stream is not None:
+            try:
+                yield stream
+            finally:
+                reader.close()
+            return
+    img = Image.open(img_path)
+    if img.format == "JPEG":
+        # Only DCT payloads survive JPEG compression
+        yield stego_engine.open_payload(stego_dct.carrier_reader(img), key)
+        return
+    yield stego_engine.open_payload(stego_engine.PlaneReader(np.asarray(img.convert("RGB"))), key)
 
-        message_bits = bits[start_index:end_index]
+# ✅ Extract and decrypt the message hidden in an image file
+def extract_message_file(img_path, streaming=None, key=None, use_cache=True):
+    """Extract and decrypt the message hidden in the image at ``img_path``.
 
-        # Convert bits to bytes
-        byte_array = bytearray()
-        for i in range(0, len(message_bits), 8):
-            byte = message_bits[i:i+8]
-            if len(byte) == 8:
-                byte_array.append(int(byte, 2))
+    ``streaming`` forces (True) or disables (False) row-band decoding; by
+    default it is used for images of at least STREAMING_MIN_PIXELS whose
+    payload ends within the first STREAMING_MAX_ROW_FRACTION of the rows.
+    ``key`` must match the one used to hide the message. Results are cached
+    per key until the file changes unless ``use_cache`` is False.
+    """
+    key = _user_key(key)
+    key_id = hashlib.sha256(key).hexdigest()
+    fingerprint = file_utils.file_fingerprint(img_path) if use_cache else None
+    if fingerprint is not None:
+        cached = stego_cache.extraction_cache.get(img_path, fingerprint, key_id)
+        if cached is not None:
+            return cached
 
-        # Decrypt the message
-        decrypted = decrypt_message(bytes(byte_array))
-        return decrypted
+    try:
+        try:
+            with _open_payload_stream(img_path, streaming, key) as stream:
+                # Decrypt the message
+                extracted = _read_text(stream, key)
+        except ValueError as e:
+            extracted = f"[ERROR] {str(e)}"
 
     except Exception as e:
         return f"[ERROR] Failed to extract message: {str(e)}"
+
+    stego_cache.extraction_cache.put(img_path, fingerprint, key_id, extracted)
+    return extracted
+
+# ✅ Extract a hidden file from an image file into ``out_path``
+def extract_file(img_path, out, streaming=None, key=None):
+    """Decrypt the file hidden in ``img_path`` into the binary file object ``out``.
+
+    Chunks are written as they are decrypted and the payload checksum is
+    only verified after the last one, so on ValueError whatever was written
+    to ``out`` must be discarded. Returns the stored filename; raises
+    ValueError if the image holds no file.
+    """
+    key = _user_key(key)
+    with _open_payload_stream(img_path, streaming, key) as stream:
+        _check_payload_format(stream)
+        if not _is_envelope(stream.payload_format):
+            raise ValueError("Image holds a message, not a file")
+        kind, filename, data = open_envelope(stream, key)
+        if kind != PAYLOAD_FILE:
+            raise ValueError("Image holds a message, not a file")
+        for chunk in data:
+            out.write(chunk)
+    return filename
+
+# ✅ Extract message from image using LSB steganography
+def extract_message(image_filename, streaming=None, key=None):
+    """Extract the message from ``static/filtered/<image_filename>``.
+
+    An existing path that already includes a directory is used as given.
+    """
+    if os.path.dirname(image_filename) and os.path.exists(image_filename):
+        img_path = image_filename
+    else:
+        img_path = os.path.join("static", "filtered", image_filename)
+    return extract_message_file(img_path, streaming, key)
+
+# ✅ Decode an uploaded image held in memory into an RGB array
+def decode_image_bytes(data):
+    pixels = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if pixels is None:
+        raise ValueError("Could not decode image")
+    return cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB)
+
+# ✅ Hide a message in an in-memory image and return the stego image bytes
+def hide_message_bytes(image_data, message, bits_per_channel=1, strategy="sequential", key=None):
+    """Stateless counterpart of ``hide_message``: nothing touches the disk.
+
+    Returns JPEG bytes for the "dct" strategy and PNG bytes otherwise.
+    Raises ValueError if the image cannot be decoded or the message does not fit.
+    """
+    if len(message.encode('utf-8')) > MAX_PLAINTEXT_BYTES:
+        raise ValueError("Message exceeds the size limit")
+    pixels = decode_image_bytes(image_data)
+    codec, data = compress_best(message.encode('utf-8'))
+    if writes_jpeg(strategy):
+        return _encode_dct_envelope(Image.fromarray(pixels, "RGB"), PAYLOAD_TEXT, "", [data], codec, _user_key(key))
+    _embed_envelope(pixels, PAYLOAD_TEXT, "", [data], codec, bits_per_channel, strategy, _user_key(key))
+    return image_encoding.encode(pixels, "PNG")
+
+# ✅ Extract the message from an in-memory stego image
+def extract_message_bytes(image_data, key=None, try_default=False):
+    """With ``try_default`` a message sealed with the default key is accepted as well as ``key``."""
+    try:
+        if image_data[:2] == b"\xff\xd8":  # JPEG: only DCT payloads survive
+            try:
+                plane = stego_dct.carrier_reader(Image.open(io.BytesIO(image_data))).plane
+            except OSError:  # includes PIL.UnidentifiedImageError and truncated data
+                raise ValueError("Could not decode image")
+        else:
+            plane = decode_image_bytes(image_data)
+        keys = [_user_key(key)]
+        if try_default and keys[0] != SECRET_KEY:
+            keys.append(SECRET_KEY)
+        for candidate in keys:
+            try:
+                stream = stego_engine.open_payload(stego_engine.PlaneReader(plane), candidate)
+                return _read_text(stream, candidate)
+            except WrongKey:
+                if candidate is keys[-1]:
+                    raise
+    except ValueError as e:
+        return f"[ERROR] {str(e)}"
@@ -0,0 +1,84 @@
+import atexit
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import steganography
+
+# Batch steganography: fan hide/extract work for many images out over a
+# shared worker process pool and yield per-image results as they finish.
+
+MAX_WORKERS = int(os.environ.get("STEGO_BATCH_WORKERS", os.cpu_count() or 1))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ✅ Shared process pool, created on first use
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        return _pool
+
+
+# ✅ Shut the pool down (also registered at interpreter exit)
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+atexit.register(shutdown_pool)
+
+
+# ✅ Worker: hide a message in one image
+def _hide_one(image_id, filename, message, bits_per_channel, strategy, key):
+    stego_path = steganography.hide_message(filename, message, bits_per_channel, strategy, key)
+    if stego_path is None:
+        return {"image_id": image_id, "error": "Failed to hide message in image"}
+    return {"image_id": image_id, "stego_image": os.path.basename(stego_path)}
+
+
+# ✅ Worker: extract the message from one image's stego file
+def _extract_one(image_id, filename, key):
+    extracted = steganography.extract_message(f"stego_{filename}", key=key)
+    if extracted.startswith("[ERROR]"):
+        return {"image_id": image_id, "error": extracted}
+    return {"image_id": image_id, "extracted_message": extracted}
+
+
+# ✅ Run ``fn(image_id, filename, *args)`` for every image, yielding results as they complete
+def _run_batch(fn, images, *args):
+    pool = get_pool()
+    futures = {pool.submit(fn, image_id, filename, *args): image_id for image_id, filename in images}
+    try:
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {"image_id": futures[future], "error": f"Worker failed: {str(e)}"}
+    finally:
+        # Stop queued work if the consumer goes away (e.g. client disconnect)
+        for future in futures:
+            future.cancel()
+
+
+# ✅ Hide the same message in many images
+def batch_hide(images, message, bits_per_channel=1, strategy="sequential", key=None):
+    """Hide ``message`` in each ``(image_id, filename)`` of ``images``.
+
+    Yields one result dict per image, in completion order.
+    """
+    return _run_batch(_hide_one, images, message, bits_per_channel, strategy, key)
+
+
+# ✅ Extract messages from many images
+def batch_extract(images, key=None):
+    """Extract the message from ``stego_<filename>`` for each ``(image_id, filename)``.
+
+    Yields one result dict per image, in completion order.
+    """
+    return _run_batch(_extract_one, images, key)
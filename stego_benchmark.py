@@ -0,0 +1,144 @@
+import argparse
+import base64
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+from PIL import Image
+import steganography
+import stego_engine
+
+# Measured steganography benchmarks.
+#
+# Generates synthetic covers, then times steganography.hide_message_file and
+# extract_message_file (caches disabled) per cover size, strategy and payload
+# size, with warmup runs and repeats. Reports latency percentiles and peak
+# Python/NumPy memory (tracemalloc, measured in a separate untimed run) and
+# writes the results as JSON.
+
+COVER_SIZES = [(512, 512), (1024, 1024), (2048, 2048), (3840, 2160)]
+PAYLOAD_SIZES = [1024, 16 * 1024, 128 * 1024]
+PERCENTILES = (50, 90, 99)
+DEFAULT_OUTPUT = "stego_benchmark.json"
+
+
+# ✅ Synthetic photo-like cover: smooth gradients plus sensor-style noise
+def make_cover(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([x / width, y / height, (x + y) / (width + height)], axis=-1) * 200 + 20
+    noise = rng.normal(0, 6, (height, width, 3)).astype(np.float32)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+# ✅ Random printable message of ``size`` bytes (compresses to roughly 75%)
+def make_message(size, seed=0):
+    raw = np.random.default_rng(seed).integers(0, 256, size, dtype=np.uint8).tobytes()
+    return base64.b64encode(raw).decode()[:size]
+
+# ✅ Latency summary in milliseconds
+def summarize(seconds):
+    ms = np.array(seconds) * 1000
+    summary = {f"p{p}": round(float(np.percentile(ms, p)), 2) for p in PERCENTILES}
+    summary.update(mean=round(float(ms.mean()), 2), min=round(float(ms.min()), 2),
+                   max=round(float(ms.max()), 2), runs=len(seconds))
+    return summary
+
+# ✅ Time ``fn`` after ``warmup`` untimed calls, then measure its peak traced memory once
+def measure(fn, repeats, warmup):
+    for _ in range(warmup):
+        fn()
+    seconds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    result = summarize(seconds)
+    result["peak_mb"] = round(peak / (1024 * 1024), 2)
+    return result
+
+# ✅ Run the benchmark matrix and return the result document
+def run(sizes=COVER_SIZES, strategies=None, payloads=PAYLOAD_SIZES, repeats=5, warmup=1, log=print):
+    strategies = strategies or stego_engine.embedding_strategies()
+    results = []
+    with tempfile.TemporaryDirectory(prefix="stego-bench-") as workdir:
+        for width, height in sizes:
+            cover_path = os.path.join(workdir, f"cover_{width}x{height}.png")
+            Image.fromarray(make_cover(width, height)).save(cover_path, "PNG", compress_level=1)
+
+            for strategy in strategies:
+                stego_path = os.path.join(workdir, f"stego_{strategy}_{width}x{height}.png")
+                capacity = steganography.capacity_for_size(width, height)[strategy][1]
+                for payload in payloads:
+                    if payload > capacity:
+                        log(f"skip {width}x{height} {strategy} {payload} B: over capacity ({capacity} B)")
+                        continue
+                    message = make_message(payload)
+
+                    def hide():
+                        if steganography.hide_message_file(cover_path, stego_path, message,
+                                                           strategy=strategy, use_cache=False) is None:
+                            raise RuntimeError(f"hide failed for {strategy} at {width}x{height}")
+
+                    def extract():
+                        if steganography.extract_message_file(stego_path, use_cache=False) != message:
+                            raise RuntimeError(f"extract mismatch for {strategy} at {width}x{height}")
+
+                    embed_stats = measure(hide, repeats, warmup)
+                    extract_stats = measure(extract, repeats, warmup)
+                    results.append({
+                        "width": width,
+                        "height": height,
+                        "pixels": width * height,
+                        "strategy": strategy,
+                        "payload_bytes": payload,
+                        "stego_bytes": os.path.getsize(stego_path),
+                        "embed_ms": embed_stats,
+                        "extract_ms": extract_stats,
+                    })
+                    log(f"{width}x{height} {strategy:<10} {payload:>7} B  "
+                        f"embed p50 {embed_stats['p50']:>8.1f} ms  extract p50 {extract_stats['p50']:>8.1f} ms")
+
+    return {
+        "generated": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {"repeats": repeats, "warmup": warmup, "percentiles": list(PERCENTILES)},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark steganography embed/extract")
+    parser.add_argument("--sizes", nargs="+", default=[f"{w}x{h}" for w, h in COVER_SIZES],
+                        help="cover sizes as WIDTHxHEIGHT")
+    parser.add_argument("--strategies", nargs="+", default=None)
+    parser.add_argument("--payloads", nargs="+", type=int, default=PAYLOAD_SIZES, help="message sizes in bytes")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    sizes = [tuple(int(v) for v in size.lower().split("x")) for size in args.sizes]
+    report = run(sizes, args.strategies, args.payloads, args.repeats, args.warmup)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import hashlib
+import os
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+
+from file_utils import file_lock
+
+# Content-addressed cache of stego outputs.
+#
+# An artifact is keyed by (cover image content hash, payload hash, embedding
+# mode, key id), so hiding the same message in the same image twice can reuse
+# the PNG written the first time instead of decoding, embedding and encoding
+# again. Total size on disk is bounded across every process sharing the
+# directory; least recently used entries go first.
+#
+# Extraction results are cached in memory per stego file (see ExtractionCache)
+# so repeat reads of an unchanged file skip decoding altogether.
+
+CACHE_DIR = os.path.join("static", "filtered", "cache")
+MAX_BYTES = int(os.environ.get("STEGO_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+EXTRACT_CACHE_BYTES = int(os.environ.get("STEGO_EXTRACT_CACHE_BYTES", 64 * 1024 * 1024))
+_HASH_CHUNK = 1 << 20
+
+
+# ✅ SHA-256 of a file's content, read in chunks
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ✅ Build the cache key for one hide request
+def cache_key(cover_path, payload, mode, key_id="default"):
+    """``payload`` is the plaintext as bytes; ``mode`` names the embedding mode."""
+    parts = [file_digest(cover_path), hashlib.sha256(payload).hexdigest(), str(mode), str(key_id)]
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+class StegoCache:
+    """Byte-bounded LRU of stego artifacts stored under ``cache_dir``.
+
+    The directory itself is the index, so every process using it (the app
+    and the batch and job worker pools) sees the same entries and the byte
+    limit holds overall. A file's mtime is its last use; ``store`` rescans
+    the directory under a lock file and removes the least recently used
+    files. Hit/miss/eviction counters are per process.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()  # guards the counters
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    # Artifacts on disk as (mtime, path, size), least recently used first
+    def _scan(self):
+        found = []
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return found
+        for name in names:
+            if name.endswith(".png"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # evicted by another process
+                found.append((stat.st_mtime_ns, path, stat.st_size))
+        return sorted(found)
+
+    def _evict(self):
+        with file_lock(os.path.join(self.cache_dir, ".lock")):
+            entries = self._scan()
+            total = sum(size for _, _, size in entries)
+            for _, path, size in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                with self.lock:
+                    self.evictions += 1
+
+    # ✅ Copy a cached artifact to ``dest_path``; returns False on a miss
+    def fetch(self, key, dest_path):
+        path = self._path(key)
+        try:
+            # Copy rather than link: the destination is rewritten in place later
+            shutil.copyfile(path, dest_path)
+            os.utime(path)
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return False
+        with self.lock:
+            self.hits += 1
+        return True
+
+    # ✅ Store a freshly written artifact under ``key``
+    def store(self, key, src_path):
+        if os.path.getsize(src_path) > self.max_bytes:
+            return  # would evict everything else and then itself
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        # Readers in other processes only ever see complete files
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(src_path, temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._evict()
+
+    # ✅ Hit/miss counters (this process) and current size (all processes)
+    def stats(self):
+        entries = self._scan()
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "bytes": sum(size for _, _, size in entries),
+                "max_bytes": self.max_bytes,
+            }
+
+
+stego_cache = StegoCache()
+
+
+class ExtractionCache:
+    """In-memory LRU of extraction results per stego file and key.
+
+    Entries are keyed by the file's real path and remember the fingerprint
+    the result was computed for; a lookup against a rewritten or deleted
+    file drops the entry. Writers also call ``invalidate`` explicitly.
+    Total result size in memory is bounded by ``max_bytes``.
+    """
+
+    def __init__(self, max_bytes=EXTRACT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()  # (path, key id) -> (fingerprint, result, size)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # ✅ Cached result for ``path`` at ``fingerprint`` under ``key_id``, or None
+    def get(self, path, fingerprint, key_id):
+        entry_key = (os.path.realpath(path), key_id)
+        with self.lock:
+            entry = self.entries.get(entry_key)
+            if entry is None or fingerprint is None or entry[0] != fingerprint:
+                if entry is not None:
+                    self._drop(entry_key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(entry_key)
+            self.hits += 1
+            return entry[1]
+
+    # Remove one entry (caller holds the lock)
+    def _drop(self, entry_key):
+        self.bytes -= self.entries.pop(entry_key)[2]
+
+    # ✅ Remember the result extracted from ``path`` at ``fingerprint``
+    def put(self, path, fingerprint, key_id, result):
+        if fingerprint is None:
+            return
+        size = sys.getsizeof(result)
+        entry_key = (os.path.realpath(path), key_id)
+        with self.lock:
+            if entry_key in self.entries:
+                self._drop(entry_key)
+            if size > self.max_bytes:
+                return  # would evict everything else and then itself
+            self.entries[entry_key] = (fingerprint, result, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+
+    # ✅ Forget every result for ``path`` (call after rewriting or deleting it)
+    def invalidate(self, path):
+        real_path = os.path.realpath(path)
+        with self.lock:
+            for entry_key in [k for k in self.entries if k[0] == real_path]:
+                self._drop(entry_key)
+
+    # ✅ Hit/miss counters and current size
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+extraction_cache = ExtractionCache()
@@ -0,0 +1,167 @@
+import io
+import numpy as np
+from PIL import Image
+import stego_engine
+
+# DCT-domain steganography with JPEG output.
+#
+# LSB payloads do not survive JPEG compression, so covers saved as JPEG carry
+# the payload in quantised DCT coefficients of the luma channel instead: each
+# 8x8 block holds one bit in each of a few mid-frequency coefficients, set by
+# quantisation index modulation (the coefficient is moved to the nearest
+# multiple of QIM_STEP whose parity is the bit). The step is well above the
+# JPEG quantisation error at JPEG_QUALITY, so the bits survive the encoder.
+#
+# The bitstream is the regular stego_engine header followed by the payload,
+# with "dct" recorded as the strategy; open_payload reads it through a
+# PlaneReader over the carrier parities.
+
+BLOCK = 8
+QIM_STEP = 16
+JPEG_QUALITY = 90
+PROJECTION_ROUNDS = 4  # re-embed after clipping to 0-255 until the carriers settle
+
+# Mid-frequency coefficients used per block (row, column)
+_CARRIER_ROWS = np.array([1, 2, 2, 1, 3])
+_CARRIER_COLS = np.array([2, 1, 2, 3, 1])
+CARRIERS_PER_BLOCK = _CARRIER_ROWS.size
+
+
+# ✅ Orthonormal DCT-II matrix: coefficients = D @ block @ D.T
+def _dct_matrix(n=BLOCK):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+_DCT = _dct_matrix()
+
+
+# ✅ Split the top-left ``block_count`` blocks of a luma plane into an (N, 8, 8) float array
+def _to_blocks(luma, block_count):
+    block_cols = luma.shape[1] // BLOCK
+    if block_count == 0 or block_cols == 0:
+        return np.empty((0, BLOCK, BLOCK))  # narrower or shorter than one block
+    block_rows = -(-block_count // block_cols)
+    region = luma[:block_rows * BLOCK, :block_cols * BLOCK].astype(np.float64)
+    blocks = region.reshape(block_rows, BLOCK, block_cols, BLOCK).swapaxes(1, 2)
+    return blocks.reshape(-1, BLOCK, BLOCK)[:block_count]
+
+# ✅ Write (N, 8, 8) blocks back over the top-left of a luma plane
+def _from_blocks(luma, blocks):
+    block_cols = luma.shape[1] // BLOCK
+    block_rows = -(-blocks.shape[0] // block_cols)
+    padded = np.empty((block_rows * block_cols, BLOCK, BLOCK))
+    padded[:blocks.shape[0]] = blocks
+    # Blocks past the end of the payload keep their original pixels
+    padded[blocks.shape[0]:] = _to_blocks(luma, block_rows * block_cols)[blocks.shape[0]:]
+    region = padded.reshape(block_rows, block_cols, BLOCK, BLOCK).swapaxes(1, 2)
+    luma[:block_rows * BLOCK, :block_cols * BLOCK] = region.reshape(block_rows * BLOCK, block_cols * BLOCK)
+
+# ✅ Number of 8x8 blocks in a cover
+def block_count(width, height):
+    return (width // BLOCK) * (height // BLOCK)
+
+# ✅ Quantisation lattice points nearest ``values`` whose parity equals ``bits``
+def _qim_targets(values, bits):
+    scaled = values / QIM_STEP
+    q = np.rint(scaled)
+    wrong = (q.astype(np.int64) & 1) != bits
+    q[wrong] += np.where(scaled[wrong] >= q[wrong], 1.0, -1.0)
+    return q * QIM_STEP
+
+# ✅ Embed a bit array into the luma plane of a YCbCr array in place
+def embed_bits(ycbcr, bits):
+    luma = ycbcr[..., 0]
+    height, width = luma.shape
+    blocks_needed = -(-bits.size // CARRIERS_PER_BLOCK)
+    if blocks_needed > block_count(width, height):
+        raise ValueError("Message too large for cover image")
+
+    padded_bits = np.zeros(blocks_needed * CARRIERS_PER_BLOCK, dtype=np.int64)
+    padded_bits[:bits.size] = bits
+    padded_bits = padded_bits.reshape(blocks_needed, CARRIERS_PER_BLOCK)
+    active = np.zeros_like(padded_bits, dtype=bool)
+    active.reshape(-1)[:bits.size] = True
+
+    pixels = _to_blocks(luma, blocks_needed)
+    for _ in range(PROJECTION_ROUNDS):
+        coeffs = _DCT @ pixels @ _DCT.T
+        values = coeffs[:, _CARRIER_ROWS, _CARRIER_COLS]
+        targets = _qim_targets(values, padded_bits)
+        if np.all(np.abs(values - targets)[active] < QIM_STEP / 4):
+            break
+        values[active] = targets[active]
+        coeffs[:, _CARRIER_ROWS, _CARRIER_COLS] = values
+        pixels = np.clip(np.rint(_DCT.T @ coeffs @ _DCT), 0, 255)
+
+    plane = luma.astype(np.float64)
+    _from_blocks(plane, pixels)
+    ycbcr[..., 0] = plane.astype(np.uint8)
+    return ycbcr
+
+# ✅ Parity of every carrier coefficient of a luma plane, in embedding order
+def carrier_parities(luma):
+    height, width = luma.shape
+    blocks = _to_blocks(luma, block_count(width, height))
+    values = (_DCT @ blocks @ _DCT.T)[:, _CARRIER_ROWS, _CARRIER_COLS]
+    return (np.rint(values / QIM_STEP).astype(np.int64) & 1).astype(np.uint8).reshape(-1)
+
+# ✅ Luma plane of an opened image, decoded without a round trip through RGB where possible
+def read_luma(img):
+    if img.format == "JPEG":
+        img.draft("YCbCr", img.size)
+    return np.asarray(img.convert("YCbCr"))[..., 0]
+
+
+class DctQIM(stego_engine.EmbeddingStrategy):
+    """Payload in mid-frequency luma DCT coefficients; written as JPEG by ``encode_jpeg``."""
+
+    name = "dct"
+    strategy_id = 3
+    streamable = False
+    bits_per_channel_choices = (1,)
+
+    def payload_channels(self, width, height):
+        return block_count(width, height) * CARRIERS_PER_BLOCK - stego_engine.HEADER_BITS
+
+    def embed(self, pixels, bits, bits_per_channel, key, start, offset, context=None):
+        raise ValueError("DCT payloads are written with stego_dct.encode_jpeg")
+
+    def read(self, reader, count, bits_per_channel, key, start, offset, context=None):
+        # The reader walks carrier parities, not pixel channels
+        return stego_engine.read_bits(reader, count)
+
+
+stego_engine.register_strategy(DctQIM())
+
+
+# ✅ Hide a payload in a PIL image and return the stego JPEG bytes
+def encode_jpeg(img, payload, payload_format=stego_engine.PAYLOAD_FORMAT_RAW, quality=JPEG_QUALITY):
+    """Embed header + ``payload`` in the DCT domain of ``img`` and encode it as JPEG.
+
+    The JPEG is decoded again and checked before it is returned; raises
+    ValueError if the payload does not fit or would not survive compression.
+    """
+    width, height = img.size
+    if len(payload) > stego_engine.payload_capacity(width, height, 1, DctQIM.name):
+        raise ValueError("Message too large for cover image")
+    header = stego_engine.build_header(payload, 1, DctQIM.name, payload_format)
+    bits = stego_engine.bytes_to_bits(header + payload)
+
+    ycbcr = np.array(img.convert("YCbCr"))
+    embed_bits(ycbcr, bits)
+    output = io.BytesIO()
+    Image.fromarray(ycbcr, "YCbCr").save(output, "JPEG", quality=quality)
+
+    # Verify against what a reader will actually decode
+    with Image.open(io.BytesIO(output.getvalue())) as check:
+        parities = carrier_parities(read_luma(check))
+    if not np.array_equal(parities[:bits.size], bits):
+        raise ValueError("Payload did not survive JPEG compression")
+    return output.getvalue()
+
+# ✅ Channel reader over the DCT carriers of an opened image, for stego_engine.open_payload
+def carrier_reader(img):
+    return stego_engine.PlaneReader(carrier_parities(read_luma(img)))
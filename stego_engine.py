@@ -0,0 +1,713 @@
+import functools
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+import png_stream
+
+# Unified steganography engine.
+#
+# Everything that places payload bits in pixels or reads them back lives here:
+# the stego header, the bit packing helpers, the channel readers and a registry
+# of embedding strategies. Crypto and file handling stay in steganography.py;
+# this module only moves bytes in and out of RGB arrays (H x W x 3 uint8),
+# viewed as one flattened channel plane (R, G, B, R, G, B, ...).
+
+# Legacy LSB markers framing the payload bitstream (read-only support)
+START_MARKER = '1111111111111111'
+END_MARKER = '1111111111111110'
+_START_MARKER_BITS = np.array([int(b) for b in START_MARKER], dtype=np.uint8)
+_END_MARKER_BITS = np.array([int(b) for b in END_MARKER], dtype=np.uint8)
+_LEGACY_SCAN_CHUNK = 1 << 16  # channels scanned per step by the legacy readers
+
+# Stego header: magic + version, followed by the header fields.
+# The header is always written at 1 bit per channel so it can be read before
+# the payload's bits-per-channel mode is known.
+HEADER_MAGIC = b"SPP"
+HEADER_VERSION = 4
+_HEADER_PREFIX = struct.Struct(">3sB")
+_HEADER_FIELDS = struct.Struct(">BBBII")  # strategy id, bits per channel, payload format, length, CRC-32
+HEADER_BITS = (_HEADER_PREFIX.size + _HEADER_FIELDS.size) * 8
+HEADER_PIXELS = -(-HEADER_BITS // 3)
+
+# Opaque to the engine: tells the caller how to interpret payload bytes
+PAYLOAD_FORMAT_RAW = 0
+
+# Payload bytes handed out per chunk when streaming extraction; a multiple of
+# 12 bytes so every chunk fills whole channels for 1-4 bits per channel
+READ_CHUNK_BYTES = 12 * 16384
+
+# Supported LSBs per colour channel for the payload
+BITS_PER_CHANNEL_CHOICES = (1, 2, 3, 4)
+
+# Number of (shape, key) pixel permutations kept in memory
+PERMUTATION_CACHE_SIZE = 4
+
+# Covers at least this large are embedded in horizontal bands on a thread pool
+# (NumPy releases the GIL for the bit operations)
+PARALLEL_MIN_PIXELS = 3840 * 2160
+PARALLEL_BAND_ROWS = 256
+EMBED_THREADS = int(os.environ.get("STEGO_EMBED_THREADS", os.cpu_count() or 1))
+_embed_pool = None
+_embed_pool_lock = threading.Lock()
+
+# Recovered payload bytes, the strategy that held them and their payload format
+Payload = namedtuple("Payload", ["data", "strategy", "payload_format"])
+
+
+# Raised when a payload cannot be read from streamed row bands
+class StreamingUnsupported(ValueError):
+    pass
+
+
+# -------------------- BIT HELPERS --------------------
+
+# ✅ Pack a bit array into per-channel values of ``bits_per_channel`` bits
+def _bits_to_values(bits, bits_per_channel):
+    if bits_per_channel == 1:
+        return bits
+    remainder = -bits.size % bits_per_channel
+    if remainder:
+        bits = np.concatenate((bits, np.zeros(remainder, dtype=np.uint8)))
+    weights = (1 << np.arange(bits_per_channel - 1, -1, -1)).astype(np.uint8)
+    return bits.reshape(-1, bits_per_channel) @ weights
+
+# ✅ Unpack per-channel values of ``bits_per_channel`` bits into a bit array
+def _values_to_bits(values, bits_per_channel):
+    if bits_per_channel == 1:
+        return values & 1
+    shifts = np.arange(bits_per_channel - 1, -1, -1, dtype=np.uint8)
+    return ((values[:, None] >> shifts) & 1).reshape(-1)
+
+# ✅ Bits of a byte string, most significant first
+def bytes_to_bits(data):
+    return np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+
+# ✅ Shared thread pool for band-parallel embedding, created on first use
+def _get_embed_pool():
+    global _embed_pool
+    with _embed_pool_lock:
+        if _embed_pool is None:
+            _embed_pool = ThreadPoolExecutor(max_workers=EMBED_THREADS,
+                                             thread_name_prefix="stego-embed")
+        return _embed_pool
+
+# ✅ Call ``write(lo, hi)`` over ``[0, count)`` channel values, banded across threads for large covers
+def _run_banded(pixels, count, write):
+    height, width = pixels.shape[:2]
+    band = PARALLEL_BAND_ROWS * width * 3
+    if height * width < PARALLEL_MIN_PIXELS or EMBED_THREADS < 2 or count <= band:
+        write(0, count)
+        return
+    ranges = [(lo, min(lo + band, count)) for lo in range(0, count, band)]
+    for future in [_get_embed_pool().submit(write, lo, hi) for lo, hi in ranges]:
+        future.result()
+
+# ✅ Write bits into the low bits of an RGB array with masked slice operations
+def embed_bits(pixels, bits, start=0, bits_per_channel=1):
+    """Embed ``bits`` (uint8 0/1 array) into ``pixels`` (H x W x 3 uint8) in place.
+
+    ``bits_per_channel`` bits are written into each channel of the flattened
+    plane from channel ``start`` on. With one bit per channel this is exactly
+    the order the per-pixel reference in steganography.py walks, so the
+    resulting image is byte-identical. Large covers are written in row bands
+    on a thread pool.
+    """
+    plane = pixels.reshape(-1)
+    count = -(-bits.size // bits_per_channel)
+    if start + count > plane.size:
+        raise ValueError("Message too large for cover image")
+    keep = np.uint8(0xFF ^ ((1 << bits_per_channel) - 1))
+
+    def write(lo, hi):
+        values = _bits_to_values(bits[lo * bits_per_channel:hi * bits_per_channel], bits_per_channel)
+        region = plane[start + lo:start + hi]
+        region &= keep
+        region |= values.astype(np.uint8)
+
+    _run_banded(pixels, count, write)
+    return pixels
+
+
+# -------------------- CHANNEL READERS --------------------
+
+# ✅ Channel reader over an in-memory RGB array
+class PlaneReader:
+    def __init__(self, pixels):
+        self.shape = pixels.shape
+        self.plane = pixels.reshape(-1)
+        self.position = 0
+
+    def read(self, count):
+        values = self.plane[self.position:self.position + count]
+        self.position += values.size
+        return values
+
+    def gather(self, slots):
+        return self.plane[slots]
+
+
+# ✅ Sequential channel reader over streamed row bands
+class BandReader:
+    """Read channel values from an iterator of RGB row bands, decoding bands lazily."""
+
+    def __init__(self, bands):
+        self.bands = bands
+        self.buffer = np.empty(0, dtype=np.uint8)
+
+    def read(self, count):
+        parts = [self.buffer]
+        available = self.buffer.size
+        while available < count:
+            band = next(self.bands, None)
+            if band is None:
+                break
+            values = band.reshape(-1)
+            parts.append(values)
+            available += values.size
+        values = np.concatenate(parts) if len(parts) > 1 else self.buffer
+        self.buffer = values[count:]
+        return values[:count]
+
+    def close(self):
+        close = getattr(self.bands, "close", None)
+        if close is not None:
+            close()
+
+
+# ✅ Read exactly ``count`` payload bits, ``bits_per_channel`` per channel, or fail
+def read_bits(reader, count, bits_per_channel=1):
+    channels = -(-count // bits_per_channel)
+    values = reader.read(channels)
+    if values.size < channels:
+        raise ValueError("Image too small for declared payload")
+    return _values_to_bits(values, bits_per_channel)[:count]
+
+
+# -------------------- STRATEGY REGISTRY --------------------
+
+class EmbeddingStrategy:
+    """Base class for payload placement strategies.
+
+    Header-framed strategies have a ``strategy_id`` recorded in the stego
+    header and implement ``embed``/``read``. Both receive ``start``, the
+    channel where the payload region begins (the header length of the image
+    being written or read), and ``offset``, the number of payload channels
+    already handled, so payloads can be written and read in chunks.
+    ``prepare`` runs once per payload before the first chunk; whatever it
+    returns (such as a pixel order) is passed back as ``context``. Legacy
+    formats predate the header; they are read-only (``embeddable = False``)
+    and implement ``read_legacy``, which is tried when no header is present.
+    """
+
+    name = None
+    strategy_id = None
+    embeddable = True
+    streamable = True  # payload can be read from sequential row bands
+    bits_per_channel_choices = BITS_PER_CHANNEL_CHOICES
+
+    # Channels available to the payload in a ``width`` x ``height`` cover
+    def payload_channels(self, width, height):
+        raise NotImplementedError
+
+    # Smallest (payload bits, channels) block the strategy writes as a unit
+    def unit(self, bits_per_channel):
+        return bits_per_channel, 1
+
+    def capacity(self, width, height, bits_per_channel=1):
+        """Maximum payload in bytes."""
+        unit_bits, unit_channels = self.unit(bits_per_channel)
+        return max(self.payload_channels(width, height) // unit_channels * unit_bits // 8, 0)
+
+    # Per-payload state shared by every chunk of one write or read
+    def prepare(self, pixels, key, start, bits_per_channel):
+        return None
+
+    def embed(self, pixels, bits, bits_per_channel, key, start, offset, context=None):
+        raise NotImplementedError
+
+    def read(self, reader, count, bits_per_channel, key, start, offset, context=None):
+        raise NotImplementedError
+
+    def read_legacy(self, reader, prefix):
+        """Return payload bytes, or None if the image is not in this format."""
+        raise NotImplementedError
+
+
+_STRATEGIES = {}
+_STRATEGIES_BY_ID = {}
+
+
+# ✅ Add a strategy instance to the registry
+def register_strategy(strategy):
+    if strategy.name in _STRATEGIES:
+        raise ValueError(f"Strategy '{strategy.name}' is already registered")
+    if strategy.strategy_id is not None:
+        if strategy.strategy_id in _STRATEGIES_BY_ID:
+            raise ValueError(f"Strategy id {strategy.strategy_id} is already registered")
+        _STRATEGIES_BY_ID[strategy.strategy_id] = strategy
+    _STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+# ✅ Look up a strategy by name
+def get_strategy(name):
+    strategy = _STRATEGIES.get(name)
+    if strategy is None:
+        raise ValueError(f"Unknown embedding strategy: {name}")
+    return strategy
+
+
+# ✅ Names of the strategies that can embed new payloads
+def embedding_strategies():
+    return [name for name, strategy in _STRATEGIES.items() if strategy.embeddable]
+
+
+class SequentialLSB(EmbeddingStrategy):
+    """Payload in the channels right after the header, 1-4 low bits each (k-LSB)."""
+
+    name = "sequential"
+    strategy_id = 0
+
+    def payload_channels(self, width, height):
+        return width * height * 3 - HEADER_BITS
+
+    def embed(self, pixels, bits, bits_per_channel, key, start, offset, context=None):
+        embed_bits(pixels, bits, start=start + offset, bits_per_channel=bits_per_channel)
+
+    def read(self, reader, count, bits_per_channel, key, start, offset, context=None):
+        # Readers are sequential and already positioned after earlier chunks
+        return read_bits(reader, count, bits_per_channel)
+
+
+# ✅ Key-derived visiting order of the pixels after the header (cached per shape and key)
+@functools.lru_cache(maxsize=PERMUTATION_CACHE_SIZE)
+def _pixel_permutation(height, width, key_digest, first_pixel):
+    pixel_count = height * width
+    dtype = np.uint32 if pixel_count <= np.iinfo(np.uint32).max else np.uint64
+    rng = np.random.default_rng(int.from_bytes(key_digest, "big"))
+    order = np.arange(first_pixel, pixel_count, dtype=dtype)
+    rng.shuffle(order)
+    order.setflags(write=False)
+    return order
+
+
+class ScatterLSB(EmbeddingStrategy):
+    """Payload in pixels visited in a pseudo-random order derived from a key."""
+
+    name = "scatter"
+    strategy_id = 1
+    streamable = False
+
+    def payload_channels(self, width, height):
+        return (width * height - HEADER_PIXELS) * 3
+
+    # Order in which payload pixels (from ``first_pixel`` on) are visited
+    def pixel_order(self, pixels, key, first_pixel, bits_per_channel):
+        if not key:
+            raise ValueError("Scatter embedding requires a key")
+        height, width = pixels.shape[:2]
+        return _pixel_permutation(height, width, hashlib.sha256(key).digest(), first_pixel)
+
+    def prepare(self, pixels, key, start, bits_per_channel):
+        return self.pixel_order(pixels, key, -(-start // 3), bits_per_channel)
+
+    # Channel indices holding scattered payload values ``offset`` to ``offset + count``
+    def slots(self, pixels, key, count, start, offset=0, bits_per_channel=1, order=None):
+        if order is None:
+            order = self.prepare(pixels, key, start, bits_per_channel)
+        first, last = offset // 3, -(-(offset + count) // 3)
+        if last > order.size:
+            raise ValueError("Message too large for cover image")
+        pixel_indices = order[first:last].astype(np.int64)
+        skip = offset % 3
+        return (pixel_indices[:, None] * 3 + np.arange(3)).reshape(-1)[skip:skip + count]
+
+    def embed(self, pixels, bits, bits_per_channel, key, start, offset, context=None):
+        plane = pixels.reshape(-1)
+        count = -(-bits.size // bits_per_channel)
+        slots = self.slots(pixels, key, count, start, offset, bits_per_channel, context)
+        keep = np.uint8(0xFF ^ ((1 << bits_per_channel) - 1))
+
+        def write(lo, hi):
+            values = _bits_to_values(bits[lo * bits_per_channel:hi * bits_per_channel], bits_per_channel)
+            band_slots = slots[lo:hi]
+            plane[band_slots] = (plane[band_slots] & keep) | values.astype(np.uint8)
+
+        _run_banded(pixels, count, write)
+
+    def read(self, reader, count, bits_per_channel, key, start, offset, context=None):
+        if not isinstance(reader, PlaneReader):
+            raise StreamingUnsupported("Scattered payloads need the full image")
+        channels = -(-count // bits_per_channel)
+        pixels = reader.plane.reshape(reader.shape)
+        values = reader.gather(self.slots(pixels, key, channels, start, offset, bits_per_channel, context))
+        return _values_to_bits(values, bits_per_channel)[:count]
+
+
+_texture_orders = OrderedDict()
+_texture_orders_lock = threading.Lock()
+
+
+# ✅ Pixels from ``first_pixel`` on, most textured first (cached per cleared image content)
+def _texture_order(pixels, first_pixel, bits_per_channel):
+    """Rank pixels by Laplacian magnitude summed over channels, ties in raster order.
+
+    The map is computed with the low ``bits_per_channel`` bits cleared, so
+    writing payload bits leaves it unchanged and the reader rebuilds the same
+    order from the stego image.
+    """
+    cleared = pixels & np.uint8(0xFF ^ ((1 << bits_per_channel) - 1))
+    cache_key = (cleared.shape, first_pixel, hashlib.blake2b(cleared).digest())
+    with _texture_orders_lock:
+        order = _texture_orders.get(cache_key)
+        if order is not None:
+            _texture_orders.move_to_end(cache_key)
+            return order
+
+    # |Laplacian| <= 4 * 255 per channel, so the sum over RGB fits in uint16
+    laplacian = cv2.Laplacian(cleared, cv2.CV_16S, ksize=1)
+    texture = np.abs(laplacian).sum(axis=2, dtype=np.uint16).reshape(-1)[first_pixel:]
+    # Stable sort of 16-bit keys is a radix sort: linear in the pixel count
+    order = np.argsort(np.uint16(0xFFFF) - texture, kind="stable")
+    dtype = np.uint32 if pixels.shape[0] * pixels.shape[1] <= np.iinfo(np.uint32).max else np.uint64
+    order = order.astype(dtype) + dtype(first_pixel)
+    order.setflags(write=False)
+
+    with _texture_orders_lock:
+        _texture_orders[cache_key] = order
+        while len(_texture_orders) > PERMUTATION_CACHE_SIZE:
+            _texture_orders.popitem(last=False)
+    return order
+
+
+class AdaptiveLSB(ScatterLSB):
+    """Edge-adaptive payload: the most textured pixels are written first.
+
+    Changes in flat regions (sky, skin) are the easiest to detect, so pixels
+    are visited in decreasing order of local texture. No key is needed; the
+    order comes from the image itself.
+    """
+
+    name = "adaptive"
+    strategy_id = 4
+
+    def pixel_order(self, pixels, key, first_pixel, bits_per_channel):
+        return _texture_order(pixels, first_pixel, bits_per_channel)
+
+
+# Hamming(7, 4) parity-check positions: channel i of a group contributes i to the syndrome
+_HAMMING_BITS = 3
+_HAMMING_GROUP = (1 << _HAMMING_BITS) - 1
+_HAMMING_POSITIONS = np.arange(1, _HAMMING_GROUP + 1, dtype=np.uint8)
+_HAMMING_SHIFTS = np.array([2, 1, 0], dtype=np.uint8)
+_HAMMING_WEIGHTS = np.uint8(1) << _HAMMING_SHIFTS
+
+
+# ✅ Syndromes of consecutive 7-channel groups (XOR of the positions whose LSB is set)
+def _hamming_syndromes(values):
+    groups = (values & 1).reshape(-1, _HAMMING_GROUP)
+    return np.bitwise_xor.reduce(groups * _HAMMING_POSITIONS, axis=1)
+
+
+class HammingLSB(EmbeddingStrategy):
+    """Matrix embedding: 3 bits per group of 7 channel LSBs, at most one LSB changed.
+
+    Each group's syndrome under the Hamming(7, 4) parity-check matrix carries
+    the bits; flipping the LSB at position ``syndrome ^ message`` sets it.
+    Compared with sequential 1-LSB this writes 3/7 as many bits per channel
+    but changes about 0.29 channels per payload bit instead of 0.5.
+    """
+
+    name = "hamming"
+    strategy_id = 2
+    bits_per_channel_choices = (1,)
+
+    def payload_channels(self, width, height):
+        return width * height * 3 - HEADER_BITS
+
+    def unit(self, bits_per_channel):
+        return _HAMMING_BITS, _HAMMING_GROUP
+
+    def embed(self, pixels, bits, bits_per_channel, key, start, offset, context=None):
+        plane = pixels.reshape(-1)
+        remainder = bits.size % _HAMMING_BITS
+        if remainder:
+            bits = np.concatenate((bits, np.zeros(_HAMMING_BITS - remainder, dtype=np.uint8)))
+        groups = bits.size // _HAMMING_BITS
+        first = start + offset
+        if first + groups * _HAMMING_GROUP > plane.size:
+            raise ValueError("Message too large for cover image")
+
+        syndromes = _hamming_syndromes(plane[first:first + groups * _HAMMING_GROUP])
+        message = bits.reshape(groups, _HAMMING_BITS) @ _HAMMING_WEIGHTS
+        flips = syndromes ^ message.astype(np.uint8)
+        changed = np.flatnonzero(flips)
+        plane[first + changed * _HAMMING_GROUP + flips[changed] - 1] ^= 1
+
+    def read(self, reader, count, bits_per_channel, key, start, offset, context=None):
+        groups = -(-count // _HAMMING_BITS)
+        values = reader.read(groups * _HAMMING_GROUP)
+        if values.size < groups * _HAMMING_GROUP:
+            raise ValueError("Image too small for declared payload")
+        syndromes = _hamming_syndromes(values)
+        bits = (syndromes[:, None] >> _HAMMING_SHIFTS) & 1
+        return bits.reshape(-1)[:count]
+
+
+class LegacyMarkerReader(EmbeddingStrategy):
+    """Original steganography.py format: START_MARKER + payload + END_MARKER, 1 LSB per channel."""
+
+    name = "legacy_marker"
+    embeddable = False
+
+    def read_legacy(self, reader, prefix):
+        prefix_bits = prefix & 1
+        if not prefix_bits[:len(START_MARKER)].all():
+            return None
+
+        leading_bits = prefix_bits[len(START_MARKER):]
+        end_marker = END_MARKER.encode()
+        overlap = len(END_MARKER) - 1
+        seen = [leading_bits]
+        scanned = 0
+        window = leading_bits
+        while True:
+            found = ((window + ord('0')).tobytes()).find(end_marker)
+            if found != -1:
+                message_bits = np.concatenate(seen)[:scanned + found]
+                usable = message_bits.size - message_bits.size % 8
+                return np.packbits(message_bits[:usable]).tobytes()
+
+            chunk = reader.read(_LEGACY_SCAN_CHUNK) & 1
+            if chunk.size == 0:
+                raise ValueError("End marker not found")
+            tail = window[-overlap:]
+            scanned += window.size - tail.size
+            window = np.concatenate((tail, chunk))
+            seen.append(chunk)
+
+
+register_strategy(SequentialLSB())
+register_strategy(ScatterLSB())
+register_strategy(HammingLSB())
+register_strategy(AdaptiveLSB())
+register_strategy(LegacyMarkerReader())
+
+
+# -------------------- HEADER AND PAYLOAD --------------------
+
+# ✅ Build the versioned header for a payload
+def build_header(payload, bits_per_channel=1, strategy="sequential", payload_format=PAYLOAD_FORMAT_RAW):
+    return _pack_header(len(payload), zlib.crc32(payload), bits_per_channel, strategy, payload_format)
+
+def _pack_header(length, checksum, bits_per_channel, strategy, payload_format):
+    fields = _HEADER_FIELDS.pack(
+        get_strategy(strategy).strategy_id, bits_per_channel, payload_format, length, checksum)
+    return _HEADER_PREFIX.pack(HEADER_MAGIC, HEADER_VERSION) + fields
+
+# ✅ Build the header-prefixed sequential 1-bit-per-channel bitstream for a payload
+def build_bitstream(payload, payload_format=PAYLOAD_FORMAT_RAW):
+    return bytes_to_bits(build_header(payload, payload_format=payload_format) + payload)
+
+# ✅ Build the legacy marker-framed bitstream (for producing old-format images in tests)
+def build_marker_bitstream(payload):
+    return np.concatenate((_START_MARKER_BITS, bytes_to_bits(payload), _END_MARKER_BITS))
+
+# ✅ Maximum payload (bytes) for a cover of the given size
+def payload_capacity(width, height, bits_per_channel=1, strategy="sequential"):
+    return get_strategy(strategy).capacity(width, height, bits_per_channel)
+
+
+class PayloadWriter:
+    """Embed a payload chunk by chunk into an RGB array.
+
+    The total length does not need to be known up front: bytes go into the
+    payload region as they are written and the header (length, CRC-32) is
+    written by ``close``. Only the current chunk is ever expanded to bits.
+    """
+
+    def __init__(self, pixels, bits_per_channel=1, strategy="sequential", key=None,
+                 payload_format=PAYLOAD_FORMAT_RAW):
+        self.strategy = get_strategy(strategy)
+        if not self.strategy.embeddable:
+            raise ValueError(f"Strategy '{strategy}' is read-only")
+        if bits_per_channel not in self.strategy.bits_per_channel_choices:
+            raise ValueError(f"Unsupported bits per channel for '{strategy}': {bits_per_channel}")
+        height, width = pixels.shape[:2]
+        self.pixels = pixels
+        self.bits_per_channel = bits_per_channel
+        self.key = key
+        self.payload_format = payload_format
+        self.capacity = self.strategy.capacity(width, height, bits_per_channel)
+        self.length = 0
+        self.checksum = 0
+        self.unit_bits, self.unit_channels = self.strategy.unit(bits_per_channel)
+        self.offset = 0  # payload channels written so far
+        self.pending = np.empty(0, dtype=np.uint8)  # bits short of a whole unit
+        self.context = self.strategy.prepare(pixels, key, HEADER_BITS, bits_per_channel)
+
+    def _embed(self, bits):
+        self.strategy.embed(self.pixels, bits, self.bits_per_channel, self.key, HEADER_BITS, self.offset,
+                            self.context)
+        self.offset += -(-bits.size // self.unit_bits) * self.unit_channels
+
+    def write(self, data):
+        if self.length + len(data) > self.capacity:
+            raise ValueError("Message too large for cover image")
+        self.length += len(data)
+        self.checksum = zlib.crc32(data, self.checksum)
+
+        bits = bytes_to_bits(data)
+        if self.pending.size:
+            bits = np.concatenate((self.pending, bits))
+        usable = bits.size - bits.size % self.unit_bits
+        if usable:
+            self._embed(bits[:usable])
+        self.pending = bits[usable:]
+
+    def close(self):
+        if self.pending.size:
+            self._embed(self.pending)  # zero-padded to a whole unit
+            self.pending = np.empty(0, dtype=np.uint8)
+        header = _pack_header(self.length, self.checksum, self.bits_per_channel,
+                              self.strategy.name, self.payload_format)
+        embed_bits(self.pixels, bytes_to_bits(header))
+        return self.pixels
+
+
+# ✅ Embed header and payload into an RGB array
+def embed_payload(pixels, payload, bits_per_channel=1, strategy="sequential", key=None,
+                  payload_format=PAYLOAD_FORMAT_RAW):
+    writer = PayloadWriter(pixels, bits_per_channel, strategy, key, payload_format)
+    writer.write(payload)
+    return writer.close()
+
+
+class PayloadStream:
+    """A payload located in an image, read chunk by chunk.
+
+    ``chunks`` verifies the CRC-32 after the last chunk and raises ValueError
+    on a mismatch, so consumers must treat output as provisional until the
+    iteration finishes.
+    """
+
+    def __init__(self, reader, strategy, payload_format, length, checksum=None,
+                 bits_per_channel=1, key=None, start=0, data=None):
+        self.reader = reader
+        self.strategy = strategy
+        self.payload_format = payload_format
+        self.length = length
+        self.checksum = checksum
+        self.bits_per_channel = bits_per_channel
+        self.key = key
+        self.start = start
+        self.data = data  # legacy payloads are recovered whole
+
+    def chunks(self, chunk_size=READ_CHUNK_BYTES):
+        # chunk_size must be a multiple of 12 bytes so chunks end on unit boundaries
+        if self.data is not None:
+            yield self.data
+            return
+
+        strategy = get_strategy(self.strategy)
+        unit_bits, unit_channels = strategy.unit(self.bits_per_channel)
+        # Only strategies that cannot stream (and so always get a PlaneReader) look at the pixels
+        pixels = self.reader.plane.reshape(self.reader.shape) if isinstance(self.reader, PlaneReader) else None
+        context = strategy.prepare(pixels, self.key, self.start, self.bits_per_channel)
+        checksum = 0
+        offset = 0
+        remaining = self.length
+        while remaining:
+            size = min(chunk_size, remaining)
+            bits = strategy.read(self.reader, size * 8, self.bits_per_channel, self.key, self.start, offset,
+                                 context)
+            chunk = np.packbits(bits).tobytes()
+            checksum = zlib.crc32(chunk, checksum)
+            offset += -(-size * 8 // unit_bits) * unit_channels
+            remaining -= size
+            yield chunk
+        if checksum != self.checksum:
+            raise ValueError("Payload checksum mismatch")
+
+    def read(self):
+        return Payload(b"".join(self.chunks()), self.strategy, self.payload_format)
+
+    def end_channel(self):
+        """Channel index just past the payload (how far into the image it reaches)."""
+        unit_bits, unit_channels = get_strategy(self.strategy).unit(self.bits_per_channel)
+        return self.start + -(-self.length * 8 // unit_bits) * unit_channels
+
+
+# ✅ Locate the payload available from a channel reader
+def open_payload(reader, key=None):
+    """Return a ``PayloadStream`` for the payload ``reader`` holds.
+
+    Only the header is read here; payload bits are read as the stream is
+    consumed (strategies such as scatter gather just the channels they
+    occupy). Without a header the legacy readers are tried in registration
+    order; images that match none of them are rejected early.
+    """
+    prefix = reader.read(_HEADER_PREFIX.size * 8)
+    if prefix.size < _HEADER_PREFIX.size * 8:
+        raise ValueError("Image too small for declared payload")
+    magic, version = _HEADER_PREFIX.unpack(np.packbits(prefix & 1).tobytes())
+
+    if magic != HEADER_MAGIC:
+        for strategy in _STRATEGIES.values():
+            if not strategy.embeddable:
+                data = strategy.read_legacy(reader, prefix)
+                if data is not None:
+                    return PayloadStream(reader, strategy.name, PAYLOAD_FORMAT_RAW, len(data), data=data)
+        raise ValueError("No hidden message found")
+    if version != HEADER_VERSION:
+        raise ValueError(f"Unsupported stego header version {version}")
+
+    strategy_id, bits_per_channel, payload_format, length, checksum = _HEADER_FIELDS.unpack(
+        np.packbits(read_bits(reader, _HEADER_FIELDS.size * 8)).tobytes())
+    if bits_per_channel not in BITS_PER_CHANNEL_CHOICES:
+        raise ValueError(f"Unsupported bits per channel: {bits_per_channel}")
+    strategy = _STRATEGIES_BY_ID.get(strategy_id)
+    if strategy is None:
+        raise ValueError(f"Unknown embedding strategy id {strategy_id}")
+    if bits_per_channel not in strategy.bits_per_channel_choices:
+        raise ValueError(f"Unsupported bits per channel for '{strategy.name}': {bits_per_channel}")
+
+    if not strategy.streamable and not isinstance(reader, PlaneReader):
+        raise StreamingUnsupported("Scattered payloads need the full image")
+
+    start = HEADER_BITS
+    return PayloadStream(reader, strategy.name, payload_format, length, checksum,
+                         bits_per_channel, key, start)
+
+# ✅ Recover the whole payload from a channel reader
+def read_payload(reader, key=None):
+    return open_payload(reader, key).read()
+
+# ✅ Recover the payload from an RGB array
+def extract_payload(pixels, key=None):
+    return read_payload(PlaneReader(pixels), key)
+
+# ✅ Channel reader that decodes a PNG in row bands (close it when done)
+def open_band_reader(img_path, band_rows=png_stream.DEFAULT_BAND_ROWS):
+    return BandReader(png_stream.iter_png_bands(img_path, band_rows))
+
+# ✅ Recover the payload by decoding a PNG in row bands
+def extract_payload_streaming(img_path, key=None, band_rows=png_stream.DEFAULT_BAND_ROWS):
+    """Like ``extract_payload`` but decodes only as many rows as the payload needs.
+
+    Raises ``png_stream.UnsupportedPNG`` if the file cannot be streamed and
+    ``StreamingUnsupported`` if the strategy needs random access to the image.
+    """
+    reader = open_band_reader(img_path, band_rows)
+    try:
+        return read_payload(reader, key)
+    finally:
+        reader.close()
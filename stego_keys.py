@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Per-user stego keys.
+#
+# Each user's key is derived from a server-side master secret with a
+# deliberately slow KDF (PBKDF2-HMAC-SHA256). Derived keys are kept in a
+# small in-process LRU with a TTL, so an active user pays the KDF cost once
+# rather than on every hide/extract. Per-message keys are derived from the
+# user key and the random nonce stored with each payload (see steganography).
+#
+# STEGO_MASTER_SECRET must be set: ``configure`` (called by app.py at startup)
+# refuses to run without it, except in debug mode where a fixed development
+# secret is used with a warning.
+
+logger = logging.getLogger(__name__)
+
+MASTER_SECRET = os.environ.get("STEGO_MASTER_SECRET", "").encode() or None
+DEV_MASTER_SECRET = "spp-development-master-secret"  # debug only: public in the source
+KDF_ITERATIONS = int(os.environ.get("STEGO_KDF_ITERATIONS", 310000))
+KEY_CACHE_SIZE = int(os.environ.get("STEGO_KEY_CACHE_SIZE", 256))
+KEY_CACHE_TTL = float(os.environ.get("STEGO_KEY_CACHE_TTL", 15 * 60))  # seconds
+
+
+# ✅ Check the master secret at startup; outside ``debug`` a missing secret is fatal
+def configure(debug=False):
+    global MASTER_SECRET
+    if MASTER_SECRET is not None:
+        return
+    if not debug:
+        raise RuntimeError("STEGO_MASTER_SECRET is not set; refusing to derive user keys "
+                           "from the public development secret")
+    logger.warning("STEGO_MASTER_SECRET is not set: using the PUBLIC development secret. "
+                   "Every user's stego key is derivable from the source code. Never run like this in production.")
+    # Through the environment so worker processes (spawned or forked) agree
+    os.environ["STEGO_MASTER_SECRET"] = DEV_MASTER_SECRET
+    MASTER_SECRET = DEV_MASTER_SECRET.encode()
+
+# ✅ Derive a user's 32-byte key (slow by design)
+def derive_user_key(user_id, iterations=KDF_ITERATIONS):
+    if MASTER_SECRET is None:
+        raise RuntimeError("STEGO_MASTER_SECRET is not set")
+    salt = hashlib.sha256(f"spp-user:{user_id}".encode()).digest()
+    return hashlib.pbkdf2_hmac("sha256", MASTER_SECRET, salt, iterations, dklen=32)
+
+
+class DerivedKeyCache:
+    """LRU of derived user keys; entries expire ``ttl`` seconds after derivation."""
+
+    def __init__(self, max_entries=KEY_CACHE_SIZE, ttl=KEY_CACHE_TTL, derive=derive_user_key):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.derive = derive
+        self.entries = OrderedDict()  # user id -> (key, expiry), least recently used first
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    # ✅ Key for ``user_id``, deriving it on a miss or after expiry
+    def get(self, user_id):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Derive outside the lock so other users are not held up by the KDF
+        key = self.derive(user_id)
+        with self.lock:
+            self.entries[user_id] = (key, time.monotonic() + self.ttl)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return key
+
+    # ✅ Drop one user's key, or every key when ``user_id`` is None
+    def invalidate(self, user_id=None):
+        with self.lock:
+            if user_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(user_id, None)
+
+    # ✅ Hit/miss counters and current size
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }
+
+
+key_cache = DerivedKeyCache()
+
+
+# ✅ Stego key for a user (cached)
+def user_key(user_id):
+    return key_cache.get(user_id)
+
+
+# ✅ Forget a user's cached key (e.g. on logout)
+def invalidate_user_key(user_id):
+    key_cache.invalidate(user_id)
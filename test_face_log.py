@@ -0,0 +1,86 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import face_log
+
+# Checks for the batched face operation log
+
+
+def record(user_id, operation="verification", when=None):
+    when = when or datetime.now()
+    return {"timestamp": when.isoformat(), "operation": operation, "user_id": user_id}
+
+
+def make_log(tmp_path, **kwargs):
+    return face_log.OperationLog(str(tmp_path / "operations"), **kwargs)
+
+
+def test_records_are_written_as_jsonl(tmp_path):
+    log = make_log(tmp_path)
+    records = [record(1), record(2, "registration")]
+    for item in records:
+        log.append(item)
+    assert log.flush()
+    [segment] = log.segments()
+    with open(segment) as f:
+        assert [json.loads(line) for line in f] == records
+    log.close()
+
+
+def test_query_filters(tmp_path):
+    log = make_log(tmp_path)
+    start = datetime(2025, 1, 1)
+    for i in range(6):
+        log.append(record(i % 2, "registration" if i == 0 else "verification", start + timedelta(hours=i)))
+    assert [r["timestamp"] for r in log.query(user_id=0)] == [
+        (start + timedelta(hours=i)).isoformat() for i in (0, 2, 4)]
+    assert len(log.query(user_id="0", operation="verification")) == 2
+    assert len(log.query(since=start + timedelta(hours=3))) == 3
+    assert log.query(user_id=1, limit=1)[0]["timestamp"] == (start + timedelta(hours=5)).isoformat()
+    log.close()
+
+
+def test_segments_rotate_by_size(tmp_path):
+    log = make_log(tmp_path, max_bytes=200)
+    for i in range(20):
+        log.append(record(i))
+        log.flush()
+    assert len(log.segments()) > 1
+    assert len(log.query()) == 20
+    log.close()
+
+
+def test_line_cut_short_by_a_crash_is_skipped(tmp_path):
+    log = make_log(tmp_path)
+    log.append(record(1))
+    log.flush()
+    with open(log.segments()[0], "a") as f:
+        f.write('{"timestamp": "2025-')
+    log2 = make_log(tmp_path)
+    assert [r["user_id"] for r in log2.query()] == [1]
+    log.close()
+
+
+def test_close_writes_queued_records(tmp_path):
+    log = make_log(tmp_path)
+    for i in range(100):
+        log.append(record(i))
+    log.close()
+    assert not log.thread.is_alive()
+    assert len(make_log(tmp_path).query()) == 100
+
+
+def test_import_legacy_logs(tmp_path, monkeypatch):
+    log = make_log(tmp_path)
+    monkeypatch.setattr(face_log, "operation_log", log)
+    legacy = tmp_path / "legacy"
+    legacy.mkdir()
+    for name, item in (("registration_1_a.json", record(1, "registration")),
+                       ("verification_1_b.json", record(1))):
+        (legacy / name).write_text(json.dumps(item))
+    (legacy / "verification_2_c.json").write_text("{broken")
+    assert face_log.import_legacy_logs(str(legacy), remove=True) == 2
+    assert sorted(os.listdir(legacy)) == ["verification_2_c.json"]
+    assert [r["operation"] for r in face_log.user_history(1)] == ["registration", "verification"]
+    log.close()
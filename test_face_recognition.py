@@ -0,0 +1,257 @@
+import json
+import multiprocessing
+import os
+
+import numpy as np
+import pytest
+
+import face_recognition
+from face_log import OperationLog
+
+# Checks for face templates, metrics and verification; nothing touches static/
+
+
+def make_face(seed=0):
+    return np.random.default_rng(seed).integers(0, 256, face_recognition.FACE_TEMPLATE_SIZE[::-1], dtype=np.uint8)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return face_recognition.FaceTemplateStore(str(tmp_path / "faces"), max_entries=2)
+
+
+# Templates, metrics and the operation log of the module all under tmp_path
+@pytest.fixture
+def isolated(tmp_path, monkeypatch, store):
+    monkeypatch.setattr(face_recognition, "FACE_DATA_PATH", store.face_dir)
+    monkeypatch.setattr(face_recognition, "template_store", store)
+    monkeypatch.setattr(face_recognition, "metrics",
+                        face_recognition.FaceRecognitionMetrics(str(tmp_path / "logs" / "metrics.json")))
+    monkeypatch.setattr(face_recognition, "operation_log", OperationLog(str(tmp_path / "logs" / "operations")))
+    return store
+
+
+def test_template_round_trip(store):
+    template = make_face()
+    store.save(1, template)
+    loaded = store.load(1)
+    assert np.array_equal(loaded, template)
+    assert not loaded.flags.writeable
+    assert store.load(2) is None
+
+
+def test_loaded_templates_are_cached(store):
+    store.save(1, make_face())
+    first = store.load(1)
+    assert store.load(1) is first
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+# Another process (another store over the same directory) rewrites the template
+def test_rewritten_template_is_reloaded(store):
+    store.save(1, make_face(1))
+    store.load(1)
+    face_recognition.FaceTemplateStore(store.face_dir).save(1, make_face(2))
+    assert np.array_equal(store.load(1), make_face(2))
+
+
+def test_least_recently_used_template_is_evicted(store):
+    for user_id in (1, 2, 3):
+        store.save(user_id, make_face(user_id))
+    store.load(1)
+    store.load(2)
+    store.load(1)
+    store.load(3)
+    assert list(store.entries) == [1, 3]
+
+
+def test_invalidate(store):
+    store.save(1, make_face())
+    store.load(1)
+    store.invalidate(1)
+    assert store.stats()["entries"] == 0
+    store.load(1)
+    store.invalidate()
+    assert store.stats()["entries"] == 0
+
+
+def test_malformed_template_is_not_loaded(store):
+    store.save(1, make_face()[:50])
+    assert store.load(1) is None
+    with open(store.path(2), "wb") as f:
+        f.write(b"not a template")
+    assert store.load(2) is None
+
+
+def test_verification_compares_against_the_stored_template(isolated, monkeypatch):
+    face = make_face(3)
+    isolated.save(1, face_recognition.build_face_template(face))
+    monkeypatch.setattr(face_recognition, "preprocess_face", lambda path: (probe, 80.0, {}))
+    probe = face
+    assert face_recognition.verify_face(1, "probe.jpg")[0]
+    probe = make_face(4)
+    matched, message = face_recognition.verify_face(1, "probe.jpg")
+    assert not matched and "do not match" in message
+    assert face_recognition.verify_face(2, "probe.jpg") == (False, "No registered face found for this user")
+
+
+@pytest.fixture
+def metrics(tmp_path):
+    return face_recognition.FaceRecognitionMetrics(str(tmp_path / "logs" / "metrics.json"), flush_interval=3600)
+
+
+def read_metrics(metrics):
+    with open(metrics.metrics_file) as f:
+        return json.load(f)
+
+
+def test_metrics_stay_in_memory_until_flushed(metrics):
+    metrics.update_metrics("total_registrations")
+    metrics.update_metrics("average_quality_score", 80.0)
+    metrics.update_metrics("average_quality_score", 60.0)
+    assert metrics.flusher.started()
+    assert not os.path.exists(metrics.metrics_file)
+    metrics.flush()
+    current = read_metrics(metrics)
+    assert current["total_registrations"] == 1
+    assert (current["average_quality_score"], current["quality_score_samples"]) == (70.0, 2)
+    assert current["total_verifications"] == 0
+
+
+# Two processes' metrics (two instances) add up instead of overwriting each other
+def test_flushes_merge_into_the_file(metrics):
+    other = face_recognition.FaceRecognitionMetrics(metrics.metrics_file, flush_interval=3600)
+    metrics.update_metrics("total_verifications")
+    metrics.update_metrics("average_similarity_score", 0.9)
+    metrics.flush()
+    for _ in range(3):
+        other.update_metrics("total_verifications")
+        other.update_metrics("average_similarity_score", 0.5)
+    other.flush()
+    current = read_metrics(metrics)
+    assert current["total_verifications"] == 4
+    assert current["similarity_score_samples"] == 4
+    assert current["average_similarity_score"] == pytest.approx(0.6)
+
+
+def test_failed_flush_keeps_the_deltas(tmp_path):
+    blocker = tmp_path / "logs"
+    blocker.write_text("a file where the directory should be")
+    metrics = face_recognition.FaceRecognitionMetrics(str(blocker / "metrics.json"), flush_interval=3600)
+    metrics.update_metrics("total_registrations")
+    metrics.flush()
+    blocker.unlink()
+    metrics.flush()
+    assert read_metrics(metrics)["total_registrations"] == 1
+
+
+def test_concatenated_documents_are_read(metrics):
+    metrics.update_metrics("total_registrations")
+    metrics.flush()
+    with open(metrics.metrics_file, "a") as f:
+        f.write('{"total_registrations": 99}')
+    metrics.update_metrics("total_registrations")
+    metrics.flush()
+    assert read_metrics(metrics)["total_registrations"] == 2
+
+
+def _record_in_child(metrics):
+    metrics.update_metrics("total_verifications")
+
+
+# A forked child flushes its own events at exit, and none of its parent's
+def test_forked_child_starts_empty_and_flushes_at_exit(metrics):
+    metrics.update_metrics("total_registrations")
+    child = multiprocessing.get_context("fork").Process(target=_record_in_child, args=(metrics,))
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+    current = read_metrics(metrics)
+    assert (current["total_verifications"], current["total_registrations"]) == (1, 0)
+    metrics.flush()
+    assert read_metrics(metrics)["total_registrations"] == 1
+
+
+def test_template_of_an_older_version_is_stale(store, isolated):
+    store.save(1, make_face())
+    assert not store.is_stale(1)
+    with open(store.path(1), "wb") as f:
+        np.savez_compressed(f, template=make_face(), version=face_recognition.FACE_TEMPLATE_VERSION - 1)
+    assert store.load(1) is None and store.is_stale(1)
+    matched, message = face_recognition.verify_face(1, "probe.jpg")
+    assert not matched and "re-register" in message
+
+
+# Faces registered before templates existed have only the JPEG
+def test_face_image_without_a_template_is_stale(store, isolated):
+    assert not store.is_stale(1)
+    os.makedirs(store.face_dir, exist_ok=True)
+    open(face_recognition.face_image_path(1), "wb").close()
+    assert store.is_stale(1)
+
+
+def test_registration_stores_a_current_template(isolated, monkeypatch):
+    face = make_face(5)
+    monkeypatch.setattr(face_recognition, "preprocess_face", lambda path: (face, 75.0, {}))
+    assert face_recognition.register_face(1, "face.jpg")[0]
+    assert os.path.exists(face_recognition.face_image_path(1))
+    assert isolated.load(1) is not None and not isolated.is_stale(1)
+    assert face_recognition.verify_face(1, "probe.jpg")[0]
+
+
+class FakeCascade:
+    """Stands in for a Haar cascade: returns fixed boxes and records the images it saw."""
+
+    def __init__(self, boxes):
+        self.boxes = np.array(boxes, dtype=np.int32).reshape(-1, 4)
+        self.shapes = []
+
+    def detectMultiScale(self, image, *args, **kwargs):
+        self.shapes.append(image.shape)
+        return self.boxes
+
+
+@pytest.fixture
+def cascades(monkeypatch):
+    cascades = {"face": FakeCascade([]), "eye": FakeCascade([])}
+    monkeypatch.setattr(face_recognition.face_models, "get_cascade", lambda name: cascades[name])
+    return cascades
+
+
+# Detection runs on a copy at most FACE_DETECT_MAX_SIDE wide; the box maps back with a margin
+def test_detect_face_maps_the_box_back_to_full_resolution(cascades):
+    image = np.zeros((1000, 2560, 3), dtype=np.uint8)
+    cascades["face"].boxes = np.array([[10, 10, 20, 20], [100, 50, 100, 100]])
+    x, y, w, h = face_recognition.detect_face(image)
+    assert cascades["face"].shapes == [(250, 640)]
+    assert (x, y, w, h) == (340, 140, 520, 520)
+
+
+def test_detect_face_clips_to_the_image(cascades):
+    cascades["face"].boxes = np.array([[0, 0, 40, 40]])
+    assert face_recognition.detect_face(np.zeros((40, 40, 3), dtype=np.uint8)) == (0, 0, 40, 40)
+    cascades["face"].boxes = np.empty((0, 4))
+    assert face_recognition.detect_face(np.zeros((40, 40, 3), dtype=np.uint8)) is None
+
+
+@pytest.mark.parametrize("eyes, rotated", [
+    ([], False),
+    ([[20, 30, 20, 20], [120, 30, 20, 20]], False),  # already level
+    ([[20, 30, 20, 20], [120, 50, 20, 20]], True),
+    ([[20, 30, 20, 20], [40, 90, 20, 20]], False),  # steeper than MAX_ALIGN_ANGLE: a false detection
+])
+def test_align_face_crops_and_levels_the_eyes(cascades, eyes, rotated):
+    image = np.random.default_rng(6).integers(0, 256, (400, 400, 3), dtype=np.uint8)
+    cascades["eye"].boxes = np.array(eyes).reshape(-1, 4)
+    aligned = face_recognition.align_face(image, (50, 60, 200, 200))
+    roi = image[60:260, 50:250]
+    assert aligned.shape == roi.shape
+    assert np.array_equal(aligned, roi) != rotated
+
+
+def test_preprocess_face_without_an_image_or_a_face(cascades, tmp_path):
+    assert face_recognition.preprocess_face(str(tmp_path / "missing.jpg")) == (None, 0.0, {})
+    path = str(tmp_path / "blank.png")
+    face_recognition.cv2.imwrite(path, np.zeros((50, 50, 3), dtype=np.uint8))
+    assert face_recognition.preprocess_face(path) == (None, 0.0, {})
@@ -0,0 +1,76 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import image_encoding
+
+# Checks for the output encoder and its profiles
+
+
+def make_pixels(width=80, height=60, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+@pytest.mark.parametrize("profile", sorted(image_encoding.PROFILES))
+@pytest.mark.parametrize("order", ["RGB", "BGR"])
+def test_png_is_lossless_for_every_profile(profile, order):
+    pixels = make_pixels()
+    source = pixels if order == "RGB" else cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR)
+    data = image_encoding.encode(source, "PNG", profile, order)
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    assert np.array_equal(decode(data), pixels)
+
+
+@pytest.mark.parametrize("profile", sorted(image_encoding.PROFILES))
+def test_jpeg_for_every_profile(profile):
+    pixels = np.full((64, 64, 3), (200, 40, 90), dtype=np.uint8)
+    data = image_encoding.encode(pixels, "JPEG", profile)
+    assert data[:2] == b"\xff\xd8"
+    # Colours are not swapped by the backend
+    assert np.abs(decode(data).astype(int) - pixels).max() < 8
+
+
+def test_grayscale_png():
+    pixels = make_pixels()[..., 0]
+    data = image_encoding.encode(pixels, "PNG", "fastest")
+    assert np.array_equal(np.asarray(Image.open(io.BytesIO(data))), pixels)
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError, match="Unknown encoder profile"):
+        image_encoding.encode(make_pixels(), "PNG", "no-such-profile")
+
+
+@pytest.mark.parametrize("path, fmt", [
+    ("a.png", "PNG"), ("a.JPG", "JPEG"), ("a.jpeg", "JPEG"), ("a.bmp", ".bmp"), ("noext", "PNG"),
+])
+def test_format_for_path(path, fmt):
+    assert image_encoding.format_for_path(path) == fmt
+
+
+def test_save_uses_the_extension(tmp_path):
+    pixels = make_pixels()
+    for name in ("out.png", "out.bmp"):
+        path = image_encoding.save(pixels, str(tmp_path / name))
+        assert np.array_equal(decode(open(path, "rb").read()), pixels)
+    assert open(tmp_path / "out.bmp", "rb").read(2) == b"BM"
+
+
+def test_unsupported_extension_is_rejected():
+    with pytest.raises(ValueError, match="Could not encode"):
+        image_encoding.encode(make_pixels(), ".nope")
+
+
+def test_benchmark_reports_every_profile(tmp_path):
+    path = str(tmp_path / "cover.png")
+    Image.fromarray(make_pixels()).save(path)
+    results = image_encoding.benchmark([path, str(tmp_path / "missing.png")], repeat=1)
+    assert [r["profile"] for r in results] == list(image_encoding.PROFILES)
+    assert all(r["pixels"] == 80 * 60 and r["bytes"] > 0 for r in results)
@@ -0,0 +1,137 @@
+import os
+import time
+
+import pytest
+
+import jobs
+
+# Checks for the background job queue and its worker processes
+
+
+def quick(job_id, value):
+    jobs.report(job_id, 0.5, "halfway")
+    return {"value": value}
+
+
+def failing(job_id):
+    raise ValueError("bad input")
+
+
+def crashing(job_id):
+    os._exit(1)
+
+
+# Reports its pid as the stage, then blocks far beyond any test timeout
+def stuck(job_id):
+    jobs.report(job_id, 0.5, str(os.getpid()))
+    time.sleep(60)
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    monkeypatch.setattr(jobs, "WARMUP_MODELS", False)
+    queue = jobs.JobQueue(max_workers=1)
+    yield queue
+    queue.shutdown()
+
+
+def wait_for(queue, job_id, condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        state = queue.get(job_id)
+        if condition(state):
+            return state
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} stuck at {queue.get(job_id)}")
+
+
+def finished(queue, job_id, timeout=10):
+    return wait_for(queue, job_id, lambda state: state["status"] in jobs.FINISHED_STATES, timeout)
+
+
+# Starts a stuck job and returns (job id, pid of the worker running it)
+def start_stuck(queue, **kwargs):
+    job_id = queue.submit("stuck", 1, stuck, **kwargs)
+    state = wait_for(queue, job_id, lambda state: state["stage"].isdigit())
+    return job_id, int(state["stage"])
+
+
+def process_exited(pid, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_job_result_and_progress(queue):
+    job_id = queue.submit("quick", 1, quick, 42)
+    state = finished(queue, job_id)
+    assert (state["status"], state["result"], state["progress"]) == (jobs.SUCCEEDED, {"value": 42}, 1.0)
+    assert state["started"] is not None
+
+
+def test_failed_job_reports_the_error(queue):
+    state = finished(queue, queue.submit("failing", 1, failing))
+    assert (state["status"], state["error"]) == (jobs.FAILED, "bad input")
+
+
+def test_jobs_are_private_to_their_user(queue):
+    job_id = queue.submit("quick", 1, quick, 1)
+    assert queue.get(job_id, user_id=2) is None
+    assert queue.cancel(job_id, user_id=2) is None
+    assert finished(queue, job_id)["status"] == jobs.SUCCEEDED
+
+
+def test_cancelling_a_running_job_frees_its_worker(queue):
+    job_id, pid = start_stuck(queue)
+    assert queue.cancel(job_id)["status"] == jobs.CANCELLED
+    assert process_exited(pid)
+    # The only worker slot is available again
+    assert finished(queue, queue.submit("quick", 1, quick, 7))["result"] == {"value": 7}
+    assert queue.get(job_id)["status"] == jobs.CANCELLED
+
+
+def test_timed_out_job_frees_its_worker(queue):
+    job_id, pid = start_stuck(queue, timeout=0.5)
+    state = finished(queue, job_id)
+    assert (state["status"], state["error"]) == (jobs.TIMED_OUT, "Job exceeded 0.5s timeout")
+    assert process_exited(pid)
+    assert finished(queue, queue.submit("quick", 1, quick, 8))["status"] == jobs.SUCCEEDED
+
+
+def test_cancelled_queued_job_never_runs(queue):
+    running, pid = start_stuck(queue)
+    queued = queue.submit("quick", 1, quick, 9)
+    assert queue.cancel(queued)["status"] == jobs.CANCELLED
+    queue.cancel(running)
+    state = finished(queue, queue.submit("quick", 1, quick, 10))
+    assert state["status"] == jobs.SUCCEEDED
+    assert queue.get(queued)["result"] is None
+
+
+def test_crashed_worker_fails_its_job_and_is_replaced(queue):
+    state = finished(queue, queue.submit("crashing", 1, crashing))
+    assert (state["status"], state["error"]) == (jobs.FAILED, "Worker process exited unexpectedly")
+    assert finished(queue, queue.submit("quick", 1, quick, 11))["status"] == jobs.SUCCEEDED
+
+
+def test_wait_for_change_sees_the_next_version(queue):
+    job_id = queue.submit("stuck", 1, stuck)
+    state, version = queue.wait_for_change(job_id, -1, timeout=1)
+    queue.cancel(job_id)
+    state, new_version = queue.wait_for_change(job_id, version, timeout=5)
+    assert new_version > version
+    assert queue.wait_for_change("missing", 0, timeout=0) == (None, 0)
+
+
+def test_shutdown_cancels_unfinished_jobs(queue):
+    job_id, pid = start_stuck(queue)
+    queued = queue.submit("quick", 1, quick, 12)
+    queue.shutdown()
+    assert queue.get(job_id)["status"] == jobs.CANCELLED
+    assert queue.get(queued)["status"] == jobs.CANCELLED
+    assert process_exited(pid)
@@ -0,0 +1,108 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import image_encoding
+import png_stream
+import stego_engine
+import steganography
+
+KEY = b"0123456789abcdef0123456789abcdef"
+
+
+# Smooth gradients with a little noise: libpng picks a mix of every filter type
+def make_cover(width=200, height=120):
+    y, x = np.mgrid[0:height, 0:width]
+    noise = np.random.default_rng(0).integers(0, 3, (height, width, 3))
+    pixels = np.stack([(x // 7 + y // 5) % 256, (x * y // 97) % 256, (x // 3) % 256], axis=-1) + noise
+    return pixels.clip(0, 255).astype(np.uint8)
+
+
+def filter_types(path, stride):
+    with open(path, "rb") as f:
+        data = f.read()
+    idat, pos = b"", 8
+    while pos < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[pos:pos + 8])
+        if chunk_type == b"IDAT":
+            idat += data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+    raw = zlib.decompress(idat)
+    return set(raw[::stride])
+
+
+def decode_bands(path, band_rows):
+    return np.concatenate(list(png_stream.iter_png_bands(path, band_rows)))
+
+
+@pytest.mark.parametrize("profile", sorted(image_encoding.PROFILES))
+def test_bands_match_full_decode(tmp_path, profile):
+    pixels = make_cover()
+    path = str(tmp_path / "cover.png")
+    image_encoding.save(pixels, path, profile=profile)
+    expected = np.asarray(Image.open(path).convert("RGB"))
+    assert np.array_equal(decode_bands(path, 7), expected)
+
+
+# cv2 (libpng adaptive filtering) as used by the default "balanced" profile
+def test_average_and_paeth_rows(tmp_path):
+    pixels = make_cover()
+    path = str(tmp_path / "cv2.png")
+    image_encoding.save(pixels, path, profile="balanced")
+    assert {3, 4} <= filter_types(path, pixels.shape[1] * 3 + 1)
+    assert np.array_equal(decode_bands(path, 16), pixels)
+
+
+def test_rgba_rows_drop_alpha(tmp_path):
+    pixels = make_cover()
+    alpha = np.full(pixels.shape[:2] + (1,), 200, dtype=np.uint8)
+    path = str(tmp_path / "rgba.png")
+    Image.fromarray(np.concatenate((pixels, alpha), axis=2), "RGBA").save(path)
+    assert np.array_equal(decode_bands(path, 16), pixels)
+
+
+@pytest.mark.parametrize("mode", ["L", "P"])
+def test_unsupported_png_is_rejected(tmp_path, mode):
+    path = str(tmp_path / "other.png")
+    Image.fromarray(make_cover()).convert(mode).save(path)
+    with pytest.raises(png_stream.UnsupportedPNG):
+        next(png_stream.iter_png_bands(path))
+
+
+def test_truncated_png_is_rejected(tmp_path):
+    path = str(tmp_path / "cover.png")
+    Image.fromarray(make_cover()).save(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data[:len(data) // 2])
+    with pytest.raises(ValueError):
+        decode_bands(path, 16)
+
+
+def test_streaming_extraction_matches_in_memory(tmp_path):
+    payload = os.urandom(500)
+    pixels = stego_engine.embed_payload(make_cover(), payload, 2)
+    path = str(tmp_path / "stego.png")
+    image_encoding.save(pixels, path)
+    assert stego_engine.extract_payload_streaming(path, band_rows=4).data == payload
+
+
+# Automatic mode streams short payloads and decodes the whole image for long ones
+@pytest.mark.parametrize("size,streamed", [(100, True), (5000, False)])
+def test_automatic_streaming_depends_on_payload_rows(tmp_path, monkeypatch, size, streamed):
+    monkeypatch.setattr(steganography, "STREAMING_MIN_PIXELS", 0)
+    pixels = make_cover()
+    payload = os.urandom(size)
+    steganography._embed_envelope(pixels, steganography.PAYLOAD_FILE, "f.bin", [payload],
+                                  steganography.CODEC_NONE, 1, "sequential", KEY)
+    path = str(tmp_path / "stego.png")
+    image_encoding.save(pixels, path)
+    with steganography._open_payload_stream(path, None, KEY) as stream:
+        assert isinstance(stream.reader, stego_engine.BandReader) == streamed
+        _, _, data = steganography.open_envelope(stream, KEY)
+        assert b"".join(data) == payload
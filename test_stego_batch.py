@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import stego_batch
+
+KEY = b"0123456789abcdef0123456789abcdef"
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(os.path.join("static", "uploads"))
+    os.makedirs(os.path.join("static", "filtered"))
+    rng = np.random.default_rng(0)
+    for name in ("a.png", "b.png"):
+        Image.fromarray(rng.integers(0, 256, (64, 96, 3), dtype=np.uint8)).save(
+            os.path.join("static", "uploads", name))
+    yield [(1, "a.png"), (2, "b.png"), (3, "missing.png")]
+    stego_batch.shutdown_pool()
+
+
+def test_batch_hide_then_extract(library):
+    hidden = {result["image_id"]: result for result in stego_batch.batch_hide(library, "batch secret", 2, key=KEY)}
+    assert hidden[1]["stego_image"] == "stego_a.png"
+    assert hidden[2]["stego_image"] == "stego_b.png"
+    assert "error" in hidden[3]
+
+    extracted = {result["image_id"]: result for result in stego_batch.batch_extract(library, KEY)}
+    assert extracted[1]["extracted_message"] == "batch secret"
+    assert extracted[2]["extracted_message"] == "batch secret"
+    assert "error" in extracted[3]
+
+
+def test_batch_extract_with_wrong_key_fails_per_image(library):
+    list(stego_batch.batch_hide(library[:1], "batch secret", key=KEY))
+    [result] = stego_batch.batch_extract(library[:1], b"x" * 32)
+    assert result["image_id"] == 1 and "error" in result
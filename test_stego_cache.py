@@ -0,0 +1,153 @@
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+import stego_cache
+import steganography
+
+KEY = b"0123456789abcdef0123456789abcdef"
+
+
+def write(path, size, fill=b"x"):
+    with open(path, "wb") as f:
+        f.write(fill * size)
+    return path
+
+
+def age(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_store_and_fetch(tmp_path):
+    cache = stego_cache.StegoCache(str(tmp_path / "cache"), max_bytes=1000)
+    src = write(str(tmp_path / "src"), 100, b"a")
+    dest = str(tmp_path / "dest")
+    assert not cache.fetch("k", dest)
+    cache.store("k", src)
+    assert cache.fetch("k", dest)
+    with open(dest, "rb") as f:
+        assert f.read() == b"a" * 100
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 100)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = stego_cache.StegoCache(str(tmp_path / "cache"), max_bytes=250)
+    src = write(str(tmp_path / "src"), 100)
+    for age_seconds, key in ((30, "old"), (20, "used"), (10, "newer")):
+        cache.store(key, src)
+        age(cache._path(key), age_seconds)
+    cache.fetch("used", str(tmp_path / "dest"))  # refreshes its mtime
+    cache.store("new", src)
+    assert sorted(os.listdir(cache.cache_dir)) == [".lock", "new.png", "used.png"]
+    assert cache.stats()["bytes"] <= 250
+
+
+def test_artifact_larger_than_the_cache_is_not_stored(tmp_path):
+    cache = stego_cache.StegoCache(str(tmp_path / "cache"), max_bytes=50)
+    cache.store("big", write(str(tmp_path / "src"), 100))
+    assert cache.stats()["entries"] == 0
+
+
+def _store_many(cache_dir, worker):
+    cache = stego_cache.StegoCache(cache_dir, max_bytes=5000)
+    src = os.path.join(cache_dir, f"src{worker}")
+    for i in range(30):
+        write(src, 400, bytes([i]))
+        cache.store(f"{worker}-{i}", src)
+
+
+# Processes sharing the directory stay within one limit between them
+def test_limit_holds_across_processes(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    os.makedirs(cache_dir)
+    workers = [multiprocessing.Process(target=_store_many, args=(cache_dir, worker)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+    stats = stego_cache.StegoCache(cache_dir, max_bytes=5000).stats()
+    assert 0 < stats["bytes"] <= 5000
+    assert not [name for name in os.listdir(cache_dir) if name.endswith(".tmp")]
+
+
+def test_cache_key_covers_every_input(tmp_path):
+    cover = write(str(tmp_path / "cover"), 10, b"c")
+    other = write(str(tmp_path / "other"), 10, b"o")
+    base = stego_cache.cache_key(cover, b"msg", "sequential-lsb1", "k")
+    assert stego_cache.cache_key(cover, b"msg", "sequential-lsb1", "k") == base
+    assert len({base,
+                stego_cache.cache_key(other, b"msg", "sequential-lsb1", "k"),
+                stego_cache.cache_key(cover, b"msg2", "sequential-lsb1", "k"),
+                stego_cache.cache_key(cover, b"msg", "sequential-lsb2", "k"),
+                stego_cache.cache_key(cover, b"msg", "sequential-lsb1", "k2")}) == 5
+
+
+def test_repeat_hide_is_served_from_the_cache(tmp_path, monkeypatch):
+    cache = stego_cache.StegoCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    monkeypatch.setattr(stego_cache, "stego_cache", cache)
+    cover_path = str(tmp_path / "cover.png")
+    Image.fromarray(np.random.default_rng(0).integers(0, 256, (64, 96, 3), dtype=np.uint8)).save(cover_path)
+    first, second = str(tmp_path / "first.png"), str(tmp_path / "second.png")
+    assert steganography.hide_message_file(cover_path, first, "cached", key=KEY) == first
+    assert steganography.hide_message_file(cover_path, second, "cached", key=KEY) == second
+    assert cache.stats()["hits"] == 1
+    with open(first, "rb") as a, open(second, "rb") as b:
+        assert a.read() == b.read()
+    assert steganography.extract_message_file(second, key=KEY) == "cached"
+
+
+def test_extraction_results_follow_the_file(tmp_path):
+    cache = stego_cache.ExtractionCache()
+    path = write(str(tmp_path / "stego.png"), 10)
+    cache.put(path, (1, 1, 10), "k", "message")
+    assert cache.get(path, (1, 1, 10), "k") == "message"
+    assert cache.get(path, (1, 1, 10), "other key") is None
+    # A rewritten file has another fingerprint; the stale entry is dropped
+    assert cache.get(path, (1, 2, 10), "k") is None
+    assert cache.get(path, (1, 1, 10), "k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_invalidate_drops_every_key_for_a_path(tmp_path):
+    cache = stego_cache.ExtractionCache()
+    path, other = write(str(tmp_path / "a.png"), 1), write(str(tmp_path / "b.png"), 1)
+    for key_id in ("k1", "k2"):
+        cache.put(path, 1, key_id, "a")
+    cache.put(other, 1, "k1", "b")
+    cache.invalidate(str(tmp_path / "." / "a.png"))
+    assert cache.get(path, 1, "k1") is None and cache.get(path, 1, "k2") is None
+    assert cache.get(other, 1, "k1") == "b"
+    assert cache.stats()["bytes"] == sys.getsizeof("b")
+
+
+def test_extraction_cache_is_bounded_by_bytes(tmp_path):
+    size = sys.getsizeof("x" * 1000)
+    cache = stego_cache.ExtractionCache(max_bytes=size * 3)
+    paths = [write(str(tmp_path / f"{i}.png"), 1) for i in range(5)]
+    for i, path in enumerate(paths[:3]):
+        cache.put(path, 1, "k", str(i) * 1000)
+    cache.get(paths[0], 1, "k")  # most recently used now
+    cache.put(paths[3], 1, "k", "3" * 1000)
+    assert cache.get(paths[1], 1, "k") is None
+    assert cache.get(paths[0], 1, "k") == "0" * 1000
+    # Larger than the whole cache: not stored, and nothing else is evicted
+    cache.put(paths[4], 1, "k", "4" * size * 4)
+    assert cache.get(paths[4], 1, "k") is None
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"]) == (3, size * 3)
+
+
+def test_rewriting_a_stego_file_invalidates_its_result(tmp_path):
+    cover_path, stego_path = str(tmp_path / "cover.png"), str(tmp_path / "stego.png")
+    Image.fromarray(np.random.default_rng(1).integers(0, 256, (64, 96, 3), dtype=np.uint8)).save(cover_path)
+    for message in ("first", "second"):
+        steganography.hide_message_file(cover_path, stego_path, message, key=KEY, use_cache=False)
+        assert steganography.extract_message_file(stego_path, key=KEY) == message
+        assert steganography.extract_message_file(stego_path, key=KEY) == message
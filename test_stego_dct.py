@@ -0,0 +1,83 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import stego_dct
+import stego_engine
+import steganography
+
+# Checks for DCT-domain embedding with JPEG output
+
+KEY = b"0123456789abcdef0123456789abcdef"
+
+
+def make_cover(width=128, height=96, seed=0):
+    # Smooth gradient plus noise: closer to a photo than uniform noise
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack(((x * 2) % 256, (y * 2) % 256, ((x + y) * 3) % 256), axis=-1)
+    noise = np.random.default_rng(seed).integers(-8, 9, base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def png_bytes(pixels):
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_payload_survives_jpeg_encoding():
+    payload = np.random.default_rng(1).bytes(100)
+    jpeg = stego_dct.encode_jpeg(Image.fromarray(make_cover()), payload)
+    assert jpeg[:2] == b"\xff\xd8"
+    with Image.open(io.BytesIO(jpeg)) as img:
+        result = stego_engine.read_payload(stego_dct.carrier_reader(img))
+    assert (result.data, result.strategy) == (payload, "dct")
+
+
+def test_message_round_trip_through_a_file(tmp_path):
+    cover_path, stego_path = str(tmp_path / "cover.png"), str(tmp_path / "stego.jpg")
+    Image.fromarray(make_cover()).save(cover_path)
+    assert steganography.hide_message_file(cover_path, stego_path, "in the DCT domain", strategy="dct",
+                                           key=KEY, use_cache=False) == stego_path
+    assert steganography.extract_message_file(stego_path, key=KEY, use_cache=False) == "in the DCT domain"
+
+
+def test_capacity_is_enforced():
+    capacity = stego_engine.payload_capacity(128, 96, 1, "dct")
+    assert capacity == (16 * 12 * stego_dct.CARRIERS_PER_BLOCK - stego_engine.HEADER_BITS) // 8
+    stego_dct.encode_jpeg(Image.fromarray(make_cover()), bytes(capacity))
+    with pytest.raises(ValueError, match="too large"):
+        stego_dct.encode_jpeg(Image.fromarray(make_cover()), bytes(capacity + 1))
+
+
+def test_lsb_payload_does_not_survive_as_jpeg():
+    stego = steganography.hide_message_bytes(png_bytes(make_cover()), "lost", key=KEY)
+    buffer = io.BytesIO()
+    Image.open(io.BytesIO(stego)).save(buffer, "JPEG", quality=95)
+    assert steganography.extract_message_bytes(buffer.getvalue(), KEY).startswith("[ERROR]")
+
+
+@pytest.mark.parametrize("data", [b"\xff\xd8", b"\xff\xd8\xff\xe0" + b"junk" * 100], ids=["soi-only", "garbage"])
+def test_corrupt_jpeg_is_reported(data):
+    assert steganography.extract_message_bytes(data, KEY) == "[ERROR] Could not decode image"
+
+
+def test_truncated_jpeg_is_reported():
+    stego = steganography.hide_message_bytes(png_bytes(make_cover()), "cut", strategy="dct", key=KEY)
+    assert steganography.extract_message_bytes(stego[:len(stego) // 2], KEY).startswith("[ERROR]")
+
+
+# Covers narrower or shorter than one 8x8 block have no carriers at all
+@pytest.mark.parametrize("size", [(4, 64), (64, 4), (7, 7)])
+def test_cover_smaller_than_a_block(size):
+    width, height = size
+    assert stego_dct.carrier_parities(np.zeros((height, width), dtype=np.uint8)).size == 0
+    buffer = io.BytesIO()
+    Image.fromarray(make_cover(width, height)).save(buffer, "JPEG")
+    result = steganography.extract_message_bytes(buffer.getvalue(), KEY)
+    assert result == "[ERROR] Image too small for declared payload"
+    assert steganography.capacity_for_size(width, height)["dct"] == {1: 0}
+    with pytest.raises(ValueError, match="too large"):
+        steganography.hide_message_bytes(png_bytes(make_cover(width, height)), "x", strategy="dct", key=KEY)
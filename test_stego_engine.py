@@ -0,0 +1,391 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import stego_engine
+import steganography
+
+# Checks for the embedding engine: run with ``python -m pytest``
+
+KEY = b"0123456789abcdef0123456789abcdef"
+
+
+def make_cover(width=96, height=64, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def random_bits(count, seed=1):
+    return np.random.default_rng(seed).integers(0, 2, count, dtype=np.uint8)
+
+
+def embed_reference(cover, bits):
+    img = steganography.embed_bits_reference(Image.fromarray(cover, "RGB"), "".join(map(str, bits)))
+    return np.asarray(img)
+
+
+# Bit counts that end on, before and after a pixel boundary
+@pytest.mark.parametrize("count", [1, 2, 3, 16, 1000, 96 * 64 * 3])
+def test_embed_bits_matches_reference(count):
+    cover = make_cover()
+    bits = random_bits(count)
+    vectorized = stego_engine.embed_bits(cover.copy(), bits)
+    assert embed_reference(cover, bits).tobytes() == vectorized.tobytes()
+
+
+def test_embed_bits_rejects_overflow():
+    with pytest.raises(ValueError):
+        stego_engine.embed_bits(make_cover(), random_bits(96 * 64 * 3 + 1))
+
+
+@pytest.mark.parametrize("reference", [False, True])
+def test_message_file_round_trip(tmp_path, reference):
+    cover_path, stego_path = str(tmp_path / "cover.png"), str(tmp_path / "stego.png")
+    Image.fromarray(make_cover()).save(cover_path)
+    message = "secret message ✓"
+    assert steganography.hide_message_file(cover_path, stego_path, message, key=KEY,
+                                           reference=reference, use_cache=False) == stego_path
+    assert steganography.extract_message_file(stego_path, key=KEY, use_cache=False) == message
+
+
+def test_payload_round_trip_reads_only_the_payload():
+    payload = b"x" * 100
+    pixels = stego_engine.embed_payload(make_cover(), payload)
+    reader = stego_engine.PlaneReader(pixels)
+    assert stego_engine.read_payload(reader).data == payload
+    assert reader.position == stego_engine.HEADER_BITS + len(payload) * 8
+
+
+def test_corrupted_payload_fails_checksum():
+    pixels = stego_engine.embed_payload(make_cover(), b"x" * 100)
+    pixels.reshape(-1)[stego_engine.HEADER_BITS + 10] ^= 1
+    with pytest.raises(ValueError, match="checksum"):
+        stego_engine.extract_payload(pixels)
+
+
+def test_declared_length_beyond_image_is_rejected():
+    header = stego_engine._pack_header(10 ** 6, 0, 1, "sequential", stego_engine.PAYLOAD_FORMAT_RAW)
+    pixels = stego_engine.embed_bits(make_cover(), stego_engine.bytes_to_bits(header))
+    with pytest.raises(ValueError, match="too small"):
+        stego_engine.extract_payload(pixels)
+
+
+def test_unknown_header_version_is_rejected():
+    header = stego_engine._HEADER_PREFIX.pack(stego_engine.HEADER_MAGIC, 99)
+    pixels = stego_engine.embed_bits(make_cover(), stego_engine.bytes_to_bits(header + bytes(16)))
+    with pytest.raises(ValueError, match="Unsupported stego header version"):
+        stego_engine.extract_payload(pixels)
+
+
+# Header versions 1-3 only existed in development builds and were never released
+@pytest.mark.parametrize("version", [1, 2, 3])
+def test_older_header_versions_are_rejected(version):
+    header = stego_engine._HEADER_PREFIX.pack(stego_engine.HEADER_MAGIC, version)
+    pixels = stego_engine.embed_bits(make_cover(), stego_engine.bytes_to_bits(header + bytes(16)))
+    with pytest.raises(ValueError, match="Unsupported stego header version"):
+        stego_engine.extract_payload(pixels)
+
+
+@pytest.mark.parametrize("payload_format", [stego_engine.PAYLOAD_FORMAT_RAW, 1, 3, 7])
+def test_headered_payload_that_is_not_an_envelope_is_rejected(tmp_path, payload_format):
+    path = str(tmp_path / "stego.png")
+    sealed = steganography.encrypt_message("not an envelope")
+    bits = stego_engine.build_bitstream(sealed, payload_format)
+    Image.fromarray(stego_engine.embed_bits(make_cover(), bits)).save(path)
+    result = steganography.extract_message_file(path, use_cache=False)
+    assert result == f"[ERROR] Unsupported payload format {payload_format}"
+    with pytest.raises(ValueError, match="Unsupported payload format"):
+        steganography.extract_file(path, io.BytesIO())
+
+
+def test_image_without_payload_is_rejected():
+    pixels = make_cover()
+    pixels &= 0xFE
+    with pytest.raises(ValueError, match="No hidden message found"):
+        stego_engine.extract_payload(pixels)
+
+
+# Images written by the original marker-framed hide_message stay readable
+def test_baseline_marker_image(tmp_path):
+    message = "baseline message"
+    bits = stego_engine.build_marker_bitstream(steganography.encrypt_message(message))
+    path = str(tmp_path / "stego.png")
+    Image.fromarray(stego_engine.embed_bits(make_cover(), bits)).save(path)
+    assert steganography.extract_message_file(path, use_cache=False) == message
+
+
+@pytest.mark.parametrize("bits_per_channel", stego_engine.BITS_PER_CHANNEL_CHOICES)
+def test_k_lsb_round_trip_at_capacity(bits_per_channel):
+    cover = make_cover()
+    capacity = stego_engine.payload_capacity(96, 64, bits_per_channel)
+    assert capacity == (96 * 64 * 3 - stego_engine.HEADER_BITS) * bits_per_channel // 8
+    payload = np.random.default_rng(2).bytes(capacity)
+    pixels = stego_engine.embed_payload(cover.copy(), payload, bits_per_channel)
+    assert stego_engine.extract_payload(pixels).data == payload
+    # Only the low bits change
+    assert not ((pixels ^ cover) >> bits_per_channel).any()
+    with pytest.raises(ValueError):
+        stego_engine.embed_payload(cover.copy(), payload + b"x", bits_per_channel)
+
+
+def test_capacity_lists_every_strategy_and_mode(tmp_path):
+    path = str(tmp_path / "cover.png")
+    Image.fromarray(make_cover()).save(path)
+    report = steganography.image_capacity(path)
+    assert (report["width"], report["height"]) == (96, 64)
+    capacity = report["capacity"]
+    assert set(capacity) == set(stego_engine.embedding_strategies())
+    for strategy, sizes in capacity.items():
+        assert tuple(sizes) == stego_engine.get_strategy(strategy).bits_per_channel_choices
+        for bits_per_channel, size in sizes.items():
+            payload = stego_engine.payload_capacity(96, 64, bits_per_channel, strategy)
+            assert size == payload - steganography.envelope_overhead()
+
+
+# The reported size is a guarantee: even an incompressible message of that length fits
+@pytest.mark.parametrize("bits_per_channel", stego_engine.BITS_PER_CHANNEL_CHOICES)
+def test_message_of_reported_capacity_fits(tmp_path, bits_per_channel):
+    cover_path, stego_path = str(tmp_path / "cover.png"), str(tmp_path / "stego.png")
+    Image.fromarray(make_cover()).save(cover_path)
+    size = steganography.capacity_for_size(96, 64)["sequential"][bits_per_channel]
+    message = "".join(chr(c) for c in np.random.default_rng(3).integers(0x21, 0x7F, size))
+    assert steganography.hide_message_file(cover_path, stego_path, message, bits_per_channel,
+                                           key=KEY, use_cache=False) == stego_path
+    assert steganography.extract_message_file(stego_path, key=KEY, use_cache=False) == message
+
+
+def test_stateless_round_trip_and_key_fallback():
+    buffer = io.BytesIO()
+    Image.fromarray(make_cover()).save(buffer, "PNG")
+    anonymous = steganography.hide_message_bytes(buffer.getvalue(), "anonymous")
+    owned = steganography.hide_message_bytes(buffer.getvalue(), "owned", key=KEY)
+    assert steganography.extract_message_bytes(anonymous) == "anonymous"
+    assert steganography.extract_message_bytes(owned, KEY) == "owned"
+    assert steganography.extract_message_bytes(owned) == "[ERROR] Wrong key for this image"
+    assert steganography.extract_message_bytes(anonymous, KEY).startswith("[ERROR] Wrong key")
+    assert steganography.extract_message_bytes(anonymous, KEY, try_default=True) == "anonymous"
+    assert steganography.extract_message_bytes(owned, b"x" * 32, try_default=True).startswith("[ERROR] Wrong key")
+
+
+@pytest.mark.parametrize("bits_per_channel", stego_engine.BITS_PER_CHANNEL_CHOICES)
+def test_scatter_round_trip(bits_per_channel):
+    cover = make_cover()
+    payload = np.random.default_rng(4).bytes(500)
+    pixels = stego_engine.embed_payload(cover.copy(), payload, bits_per_channel, "scatter", KEY)
+    assert stego_engine.extract_payload(pixels, KEY).data == payload
+
+
+def test_scatter_placement_depends_on_the_key():
+    cover = make_cover()
+    payload = np.random.default_rng(4).bytes(200)
+    first = stego_engine.embed_payload(cover.copy(), payload, 1, "scatter", KEY)
+    second = stego_engine.embed_payload(cover.copy(), payload, 1, "scatter", b"another key")
+    header_channels = stego_engine.HEADER_PIXELS * 3
+    assert not np.array_equal(first.reshape(-1)[header_channels:], second.reshape(-1)[header_channels:])
+    with pytest.raises(ValueError, match="checksum"):
+        stego_engine.extract_payload(second, KEY)
+
+
+def test_scatter_requires_a_key():
+    with pytest.raises(ValueError, match="requires a key"):
+        stego_engine.embed_payload(make_cover(), b"payload", 1, "scatter")
+
+
+def test_scatter_permutation_is_cached():
+    stego_engine._pixel_permutation.cache_clear()
+    for _ in range(3):
+        stego_engine.extract_payload(stego_engine.embed_payload(make_cover(), b"payload", 1, "scatter", KEY), KEY)
+    info = stego_engine._pixel_permutation.cache_info()
+    assert info.misses == 1 and info.hits > 0
+
+
+# Streaming cannot gather scattered channels, so extraction decodes the whole image
+def test_scatter_image_with_forced_streaming(tmp_path):
+    cover_path, stego_path = str(tmp_path / "cover.png"), str(tmp_path / "stego.png")
+    Image.fromarray(make_cover()).save(cover_path)
+    steganography.hide_message_file(cover_path, stego_path, "scattered", strategy="scatter", key=KEY, use_cache=False)
+    assert steganography.extract_message_file(stego_path, streaming=True, key=KEY, use_cache=False) == "scattered"
+
+
+# Small bands force the thread-pool path on a small cover
+@pytest.fixture
+def banded(monkeypatch):
+    monkeypatch.setattr(stego_engine, "PARALLEL_MIN_PIXELS", 0)
+    monkeypatch.setattr(stego_engine, "PARALLEL_BAND_ROWS", 3)
+    monkeypatch.setattr(stego_engine, "EMBED_THREADS", 4)
+
+
+def test_banded_embed_matches_reference(banded):
+    cover = make_cover()
+    bits = random_bits(cover.size - 5)
+    vectorized = stego_engine.embed_bits(cover.copy(), bits)
+    assert embed_reference(cover, bits).tobytes() == vectorized.tobytes()
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "scatter"])
+def test_banded_embed_matches_single_band(banded, monkeypatch, strategy):
+    cover = make_cover()
+    payload = np.random.default_rng(5).bytes(1500)
+    parallel = stego_engine.embed_payload(cover.copy(), payload, 2, strategy, KEY)
+    monkeypatch.setattr(stego_engine, "EMBED_THREADS", 1)
+    single = stego_engine.embed_payload(cover.copy(), payload, 2, strategy, KEY)
+    assert parallel.tobytes() == single.tobytes()
+
+
+def registered_modes():
+    return [(name, bits_per_channel) for name in stego_engine.embedding_strategies()
+            for bits_per_channel in stego_engine.get_strategy(name).bits_per_channel_choices]
+
+
+@pytest.mark.parametrize("strategy, bits_per_channel", registered_modes())
+def test_every_registered_mode_round_trips(strategy, bits_per_channel):
+    buffer = io.BytesIO()
+    Image.fromarray(make_cover(256, 256)).save(buffer, "PNG")
+    stego = steganography.hide_message_bytes(buffer.getvalue(), "registry", bits_per_channel, strategy, KEY)
+    assert steganography.extract_message_bytes(stego, KEY) == "registry"
+
+
+def test_duplicate_registration_is_rejected():
+    with pytest.raises(ValueError, match="already registered"):
+        stego_engine.register_strategy(stego_engine.SequentialLSB())
+
+
+def test_only_the_marker_format_is_read_without_a_header():
+    legacy = [name for name, strategy in stego_engine._STRATEGIES.items() if not strategy.embeddable]
+    assert legacy == ["legacy_marker"]
+
+
+@pytest.mark.parametrize("strategy", ["sequential", "dct"])
+def test_file_round_trip(tmp_path, strategy):
+    cover_path, stego_path = str(tmp_path / "cover.png"), str(tmp_path / "stego.png")
+    Image.fromarray(make_cover(256, 256)).save(cover_path)
+    content = np.random.default_rng(6).bytes(300)
+    assert steganography.hide_file(cover_path, stego_path, io.BytesIO(content), "notes.bin",
+                                   strategy=strategy, key=KEY) == stego_path
+    out = io.BytesIO()
+    assert steganography.extract_file(stego_path, out, key=KEY) == "notes.bin"
+    assert out.getvalue() == content
+
+
+def test_messages_and_files_are_not_confused(tmp_path):
+    cover_path = str(tmp_path / "cover.png")
+    message_path, file_path = str(tmp_path / "message.png"), str(tmp_path / "file.png")
+    Image.fromarray(make_cover()).save(cover_path)
+    steganography.hide_message_file(cover_path, message_path, "text", key=KEY, use_cache=False)
+    steganography.hide_file(cover_path, file_path, io.BytesIO(b"data"), "data.txt", key=KEY)
+    with pytest.raises(ValueError, match="holds a message"):
+        steganography.extract_file(message_path, io.BytesIO(), key=KEY)
+    assert "holds a file (data.txt)" in steganography.extract_message_file(file_path, key=KEY, use_cache=False)
+
+
+def test_file_too_large_for_the_cover_is_rejected(tmp_path):
+    cover_path, stego_path = str(tmp_path / "cover.png"), str(tmp_path / "stego.png")
+    Image.fromarray(make_cover()).save(cover_path)
+    content = np.random.default_rng(7).bytes(96 * 64 * 3 // 8)
+    assert steganography.hide_file(cover_path, stego_path, io.BytesIO(content), "big.bin", key=KEY) is None
+
+
+def test_file_size_limit():
+    with pytest.raises(ValueError, match="size limit"):
+        list(steganography._limit_chunks([b"x" * 10, b"x" * 10], limit=15))
+    assert list(steganography._limit_chunks([b"x" * 10, b"x" * 5], limit=15)) == [b"x" * 10, b"x" * 5]
+
+
+@pytest.mark.parametrize("codec", [steganography.CODEC_NONE, steganography.CODEC_ZLIB, steganography.CODEC_LZMA])
+def test_compressed_chunks_round_trip(codec):
+    chunks = [b"abc" * 5000, np.random.default_rng(8).bytes(3000), b"", b"tail"]
+    compressed = list(steganography.compress_chunks(codec, chunks))
+    assert b"".join(steganography.decompress_chunks(codec, compressed)) == b"".join(chunks)
+
+
+def test_compress_best_keeps_the_smallest():
+    assert steganography.compress_best(b"a" * 10000)[0] != steganography.CODEC_NONE
+    noise = np.random.default_rng(9).bytes(1000)
+    assert steganography.compress_best(noise) == (steganography.CODEC_NONE, noise)
+
+
+# A small compressed payload must not expand past the limit in memory
+@pytest.mark.parametrize("codec", [steganography.CODEC_NONE, steganography.CODEC_ZLIB, steganography.CODEC_LZMA])
+def test_decompression_stops_at_the_limit(codec):
+    bomb = list(steganography.compress_chunks(codec, [bytes(1 << 20)]))
+    produced = []
+    with pytest.raises(ValueError, match="size limit"):
+        for out in steganography.decompress_chunks(codec, bomb, max_output=1000):
+            produced.append(len(out))
+    assert sum(produced) <= 1000
+    assert b"".join(steganography.decompress_chunks(codec, bomb, max_output=1 << 20)) == bytes(1 << 20)
+
+
+def test_compressible_message_beyond_raw_capacity_fits(tmp_path):
+    cover_path, stego_path = str(tmp_path / "cover.png"), str(tmp_path / "stego.png")
+    Image.fromarray(make_cover()).save(cover_path)
+    message = "repeat " * 1000
+    assert len(message) > stego_engine.payload_capacity(96, 64)
+    assert steganography.hide_message_file(cover_path, stego_path, message, key=KEY, use_cache=False) == stego_path
+    assert steganography.extract_message_file(stego_path, key=KEY, use_cache=False) == message
+
+
+# Payload sizes ending inside and on a 3-bit Hamming group
+@pytest.mark.parametrize("size", [1, 3, 100, 301])
+def test_hamming_round_trip(size):
+    payload = np.random.default_rng(10).bytes(size)
+    pixels = stego_engine.embed_payload(make_cover(), payload, 1, "hamming")
+    assert stego_engine.extract_payload(pixels).data == payload
+
+
+def test_hamming_changes_fewer_channels_than_sequential():
+    cover = make_cover()
+    payload = np.random.default_rng(11).bytes(300)
+    changed = {}
+    for strategy in ("sequential", "hamming"):
+        pixels = stego_engine.embed_payload(cover.copy(), payload, 1, strategy)
+        assert not ((pixels ^ cover) >> 1).any()
+        changed[strategy] = (pixels != cover).reshape(-1)[stego_engine.HEADER_BITS:]
+    # At most one change per 7-channel group
+    groups = changed["hamming"][:changed["hamming"].size // 7 * 7].reshape(-1, 7)
+    assert groups.sum(axis=1).max() <= 1
+    assert changed["hamming"].sum() < changed["sequential"].sum() * 0.75
+
+
+def test_hamming_capacity_and_modes():
+    capacity = stego_engine.payload_capacity(96, 64, 1, "hamming")
+    assert capacity == (96 * 64 * 3 - stego_engine.HEADER_BITS) // 7 * 3 // 8
+    stego_engine.embed_payload(make_cover(), bytes(capacity), 1, "hamming")
+    with pytest.raises(ValueError):
+        stego_engine.embed_payload(make_cover(), bytes(capacity + 1), 1, "hamming")
+    assert stego_engine.get_strategy("hamming").bits_per_channel_choices == (1,)
+    with pytest.raises(ValueError):
+        stego_engine.embed_payload(make_cover(), b"payload", 2, "hamming")
+
+
+@pytest.mark.parametrize("bits_per_channel", stego_engine.BITS_PER_CHANNEL_CHOICES)
+def test_adaptive_round_trip_without_a_key(bits_per_channel):
+    payload = np.random.default_rng(12).bytes(400)
+    pixels = stego_engine.embed_payload(make_cover(), payload, bits_per_channel, "adaptive")
+    assert stego_engine.extract_payload(pixels).data == payload
+
+
+# A flat left half and a noisy right half: a small payload goes entirely to the right
+def test_adaptive_writes_textured_pixels_first():
+    cover = make_cover()
+    cover[:, :48] = 128
+    pixels = stego_engine.embed_payload(cover.copy(), np.random.default_rng(13).bytes(200), 1, "adaptive")
+    changed = (pixels != cover).any(axis=2)
+    changed.reshape(-1)[:stego_engine.HEADER_PIXELS] = False
+    assert changed[:, 48:].any() and not changed[:, :48].any()
+
+
+# The pixel order is built once per payload, not once per chunk
+def test_adaptive_order_is_computed_once_per_payload(monkeypatch):
+    calls = []
+    texture_order = stego_engine._texture_order
+    monkeypatch.setattr(stego_engine, "_texture_order", lambda *args: calls.append(1) or texture_order(*args))
+    payload = np.random.default_rng(14).bytes(1200)
+    writer = stego_engine.PayloadWriter(make_cover(), 1, "adaptive")
+    for i in range(0, len(payload), 100):
+        writer.write(payload[i:i + 100])
+    pixels = writer.close()
+    stream = stego_engine.open_payload(stego_engine.PlaneReader(pixels))
+    assert b"".join(stream.chunks(chunk_size=120)) == payload
+    assert len(calls) == 2
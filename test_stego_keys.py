@@ -0,0 +1,102 @@
+import pytest
+
+import stego_keys
+
+# Checks for per-user key derivation and the derived key cache
+
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setattr(stego_keys, "MASTER_SECRET", b"test master secret")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(stego_keys.time, "monotonic", clock)
+    return clock
+
+
+def counting_cache(**kwargs):
+    derived = []
+
+    def derive(user_id):
+        derived.append(user_id)
+        return f"key-{user_id}-{len(derived)}".encode()
+    return stego_keys.DerivedKeyCache(derive=derive, **kwargs), derived
+
+
+def test_user_keys_are_stable_and_distinct(secret):
+    first = stego_keys.derive_user_key(1, iterations=10)
+    assert len(first) == 32
+    assert stego_keys.derive_user_key(1, iterations=10) == first
+    assert stego_keys.derive_user_key(2, iterations=10) != first
+
+
+def test_derivation_depends_on_the_master_secret(secret, monkeypatch):
+    first = stego_keys.derive_user_key(1, iterations=10)
+    monkeypatch.setattr(stego_keys, "MASTER_SECRET", b"another secret")
+    assert stego_keys.derive_user_key(1, iterations=10) != first
+
+
+def test_derivation_requires_a_master_secret(monkeypatch):
+    monkeypatch.setattr(stego_keys, "MASTER_SECRET", None)
+    with pytest.raises(RuntimeError):
+        stego_keys.derive_user_key(1, iterations=10)
+
+
+def test_configure_refuses_to_run_without_a_secret(monkeypatch):
+    monkeypatch.setattr(stego_keys, "MASTER_SECRET", None)
+    monkeypatch.delenv("STEGO_MASTER_SECRET", raising=False)
+    with pytest.raises(RuntimeError):
+        stego_keys.configure(debug=False)
+    stego_keys.configure(debug=True)
+    assert stego_keys.MASTER_SECRET == stego_keys.DEV_MASTER_SECRET.encode()
+
+
+def test_cached_keys_are_derived_once(clock):
+    cache, derived = counting_cache()
+    assert cache.get(1) == cache.get(1)
+    assert derived == [1]
+    assert cache.stats()["hits"] == 1
+
+
+def test_cached_keys_expire_after_the_ttl(clock):
+    cache, derived = counting_cache(ttl=60)
+    cache.get(1)
+    clock.now += 59
+    cache.get(1)
+    clock.now += 2
+    cache.get(1)
+    assert derived == [1, 1]
+
+
+def test_invalidate_one_user_or_all(clock):
+    cache, derived = counting_cache()
+    cache.get(1)
+    cache.get(2)
+    cache.invalidate(1)
+    cache.get(1)
+    cache.get(2)
+    assert derived == [1, 2, 1]
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_key_is_evicted(clock):
+    cache, derived = counting_cache(max_entries=2)
+    cache.get(1)
+    cache.get(2)
+    cache.get(1)
+    cache.get(3)
+    cache.get(1)
+    cache.get(2)
+    assert derived == [1, 2, 3, 2]